@@ -1,162 +1,644 @@
 from flask import Flask, render_template, request, redirect, send_from_directory
-from sqlalchemy import text
-from models import db, Amiibo, Match, State
-from models import Season
+from flask import abort, g, has_app_context, jsonify, stream_with_context
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from models import db, Amiibo, Match, State, upsert
+from models import match_records, win_percentage, crosses_title_elo, refresh_titles, title_rank
+from models import Season, SeasonStanding, SeasonChampion, RatingHistory
+from models import SwissStanding, SwissPairing, LeagueStanding, LeagueFixture
+from models import KnockoutBracket, KnockoutMatch, GlickoRating, LiveEvent, Title, store_season_results
+from models import Action, Snapshot
+from eventlog import take_snapshot, restore_snapshot, latest_snapshot, actions_after
+from migrations import migrate
+from fixtures import group_fixtures
+from pairing import pair_round
+from ratings import K, BACKENDS, INITIAL_DEVIATION, INITIAL_VOLATILITY
+import bracket
+import standings
+from ratings import elo_update, load_match_log, replay, write_rating_history, write_ratings
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.exc import OperationalError
+from sqlalchemy.orm.exc import StaleDataError
+from werkzeug.exceptions import HTTPException
+from werkzeug.http import is_resource_modified
 from werkzeug.utils import secure_filename
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+import click
+import csv
+import functools
+import hashlib
+import io
 import os
 import random
 import json
+import re
+import sqlite3
+import threading
+import time
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # pictures are then stored unscaled
+    Image = None
 
 app = Flask(__name__)
 app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///amiibo.db'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+# 'elo' rates every match at once, 'glicko2' once per rating period
+app.config['RATING_BACKEND'] = 'elo'
+# play every league pairing twice, with sides swapped in the second half
+app.config['LEAGUE_DOUBLE_ROUND_ROBIN'] = False
+# SQLite performance profile, set on every new connection (see sqlite_profile())
+app.config['SQLITE_PRAGMAS'] = {
+    # readers keep reading the last commit while a result is written
+    'journal_mode': 'wal',
+    # in WAL mode a crash cannot corrupt the file, only lose the last commits
+    'synchronous': 'normal',
+    'cache_size': -64000,  # KiB per connection
+    'mmap_size': 256 * 1024 * 1024,
+    # ms a writer waits for the write lock before 'database is locked'
+    'busy_timeout': 5000,
+}
+# FLASK_* environment variables override the defaults above, e.g.
+# FLASK_SQLALCHEMY_DATABASE_URI=sqlite:////tmp/other.db or FLASK_SQLITE_PRAGMAS='{}'
+app.config.from_prefixed_env()
+# pooled connections keep their pragmas and page cache between requests;
+# an in-memory database is a single static connection instead
+if app.config['SQLALCHEMY_DATABASE_URI'] not in ('sqlite://', 'sqlite:///:memory:'):
+    app.config.setdefault('SQLALCHEMY_ENGINE_OPTIONS', {'pool_size': 8, 'max_overflow': 8})
 
 db.init_app(app)
 
-# in-memory state variables (populated from DB later)
-current_pairs = []
-current_swiss_pairs = []
-swiss_round = 0
-swiss_scores = {}
-swiss_previous_matches = set()
-league_matches = {}
-league_scores = {}
-swiss_diff = {}
-swiss_wins = {}
-swiss_opponents = {}
-league_diff = {}
-league_wins = {}
-league_results = {}
-knockout_brackets = {}
-knockout_remaining = {}
-knockout_history = {}
+# archived seasons shown per page on /seasons
+SEASONS_PER_PAGE = 10
+# default and maximum page size of the paged JSON API endpoints
+API_PAGE_SIZE = 50
+API_MAX_LIMIT = 500
+# fields each JSON list can be reduced to with ?fields=
+AMIIBO_FIELDS = (
+    'id', 'name', 'current_elo', 'peak_elo', 'title', 'league', 'ko_titles', 'league_titles',
+    'wins', 'draws', 'losses', 'win_pct', 'profile_pic',
+)
+MATCH_FIELDS = (
+    'id', 'round', 'player1_id', 'player1', 'player2_id', 'player2',
+    'score1', 'score2', 'winner_id', 'draw',
+)
+STANDING_FIELDS = ('position', 'amiibo_id', 'name', 'score', 'diff', 'wins', 'sonneborn_berger')
+FIXTURE_FIELDS = ('round', 'player1_id', 'player2_id', 'winner_id', 'draw')
+KNOCKOUT_GAME_FIELDS = ('player1_id', 'player2_id', 'winner_id', 'draw')
+SEASON_FIELDS = ('id', 'leagues', 'brackets')
+
+# profile picture variants: (pixels, crop to a square), twice the displayed size
+PROFILE_SIZES = {'thumb': (80, True), 'podium': (240, True), 'profile': (400, False)}
+# stored name of a processed picture: content hash and extension
+PROFILE_NAME = re.compile(r'[0-9a-f]{16}\.\w+')
+PROFILE_MAX_AGE = 365 * 24 * 3600
+
+# rendered read pages kept per process, keyed on (path, args, data version)
+PAGE_CACHE_SIZE = 256
+# part of every ETag so pages rendered by older code are not revalidated
+BOOT_ID = format(int(time.time()), 'x')
+
+# live feed: events kept in memory per process and in the LiveEvent table
+LIVE_BUFFER = 1000
+LIVE_KEEP = 1000
+# seconds between polls for new events and between keep-alive comments
+LIVE_POLL_INTERVAL = 0.5
+LIVE_HEARTBEAT = 15
+# seconds a missing event id may take to commit before it counts as rolled back
+LIVE_GAP_WAIT = 5
+
+# logged actions between two snapshots of the tournament state
+SNAPSHOT_EVERY = 100
+# logged actions that report results and can be undone
+RESULT_ACTIONS = ('match', 'swiss_result', 'league_result', 'knockout_result', 'results')
+# admin commands are logged and snapshotted but cannot be replayed
+ADMIN_ACTIONS = ('backfill_rating_history', 'rebuild_ratings', 'backfill_profile_pics')
+
+# attempts for a write request that lost a race against another worker
+WRITE_RETRIES = 10
+# separate generator so retry backoff leaves the global random state alone
+retry_jitter = random.Random()
+
+
+class StateConflict(Exception):
+    """Raised when another worker committed tournament state first."""
+
+
+class InvalidResult(ValueError):
+    """Raised for a batch entry that cannot be applied; ``index`` is its position."""
+
+    def __init__(self, index, message):
+        super().__init__(message)
+        self.index = index
+
+
+@event.listens_for(Engine, 'connect')
+def sqlite_profile(dbapi_connection, connection_record):
+    """Apply ``SQLITE_PRAGMAS`` to a new SQLite connection; other databases are left alone."""
+    if not isinstance(dbapi_connection, sqlite3.Connection):
+        return
+    cursor = dbapi_connection.cursor()
+    for name, value in app.config['SQLITE_PRAGMAS'].items():
+        cursor.execute(f'PRAGMA {name} = {value}')
+    cursor.close()
+
+
+# utility functions for persisting state
+def get_state(key, default):
+    """Read one State key when first needed; the session keeps it for the request."""
+    pending = g.get('state_writes', {})
+    if key in pending:
+        return pending[key]
+    entry = State.query.get(key)
+    if not entry:
+        return default
+    try:
+        return json.loads(entry.value)
+    except Exception:
+        return default
+
+def set_state(key, value):
+    """Stage a State write for the current request until save_state()."""
+    g.setdefault('state_writes', {})[key] = value
+
+def save_state():
+    """Write the staged keys and commit the request's transaction.
+
+    Staged keys go out in one batched upsert. Inside serialized_write()
+    the shared ``version`` row is bumped with a compare-and-swap against
+    the value read when the request started, so a concurrent writer that
+    committed first raises StateConflict instead of losing an update.
+    """
+    writes = g.pop('state_writes', {})
+    expected = g.get('state_version')
+    if expected is not None:
+        # lets cached read views send Last-Modified for the new version
+        writes['modified_at'] = time.time()
+    if writes:
+        rows = [{'key': key, 'value': json.dumps(value)} for key, value in sorted(writes.items())]
+        db.session.execute(upsert(State, ['key'], ['value']), rows)
+    action_id = g.pop('action_id', None)
+    if g.pop('snapshot_due', False) or (action_id and action_id % SNAPSHOT_EVERY == 0):
+        take_snapshot()
+    if expected is not None:
+        result = db.session.execute(
+            update(State)
+            .where(State.key == 'version', State.value == json.dumps(expected))
+            .values(value=json.dumps(expected + 1))
+        )
+        if result.rowcount != 1:
+            raise StateConflict()
+        g.state_version = expected + 1
+    db.session.commit()
+
 
 with app.app_context():
-    db.create_all()
-    # utility functions for persisting state
-    def get_state(key, default):
-        entry = State.query.get(key)
-        if not entry:
-            return default
-        try:
-            return json.loads(entry.value)
-        except Exception:
-            return default
-
-    def set_state(key, value):
-        entry = State.query.get(key)
-        if not entry:
-            entry = State(key=key)
-            db.session.add(entry)
-        entry.value = json.dumps(value)
-
-    def load_all_state():
-        """Load persistent state from the database."""
-        global current_pairs, current_swiss_pairs, swiss_round
-        global swiss_scores, swiss_previous_matches, league_matches
-        global league_scores, knockout_brackets, knockout_remaining
-        global knockout_history
-        global swiss_diff, swiss_wins, swiss_opponents
-        global league_diff, league_wins, league_results
-
-        current_pairs = get_state('current_pairs', [])
-        current_swiss_pairs = get_state('current_swiss_pairs', [])
-        swiss_round = get_state('swiss_round', 0)
+    migrate()
+    # drop connections opened at import so forked workers start with their own
+    db.engine.dispose()
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def count_query(conn, cursor, statement, parameters, context, executemany):
+    """Count SQL statements issued while handling the current request."""
+    if has_app_context():
+        g.sql_queries = g.get('sql_queries', 0) + 1
+
+@app.after_request
+def add_query_count(response):
+    """Expose the per-request SQL statement count as a response header."""
+    response.headers['X-SQL-Queries'] = str(g.get('sql_queries', 0))
+    return response
+
+def remember_amiibos(amiibos):
+    """Add already loaded Amiibos to the request-scoped cache."""
+    cache = g.setdefault('amiibo_cache', {})
+    for a in amiibos:
+        cache[a.id] = a
+    return cache
+
+def load_amiibos(ids):
+    """Bulk-load every referenced Amiibo with one IN query per request.
+
+    Non-integer IDs (``None``, ``'draw'``) are ignored so raw pairing tuples
+    can be passed straight through.
+    """
+    cache = g.setdefault('amiibo_cache', {})
+    missing = {i for i in ids if isinstance(i, int) and i not in cache}
+    if missing:
+        remember_amiibos(Amiibo.query.filter(Amiibo.id.in_(missing)).all())
+    return cache
+
+def get_amiibo(pid):
+    """Return an Amiibo from the request cache, loading it if needed."""
+    if pid is None:
+        return None
+    return load_amiibos([pid]).get(pid)
+
+def resolve_winner(w):
+    """Map a stored pairing result to ``'Draw'``, an Amiibo or ``None``."""
+    if w == 'draw':
+        return 'Draw'
+    return get_amiibo(w) if w else None
+
+def points(value):
+    """Return a stored score as int when it has no half point."""
+    return int(value) if float(value).is_integer() else value
+
+def swiss_standing(pid):
+    """Return the Swiss standing row of a player, creating it if missing."""
+    standing = db.session.get(SwissStanding, pid)
+    if standing is None:
+        standing = SwissStanding(amiibo_id=pid, score=0, diff=0, wins=0, buchholz=0)
+        db.session.add(standing)
+    return standing
+
+def load_swiss_standings():
+    """Return ``(scores, diff, wins, buchholz)`` dictionaries keyed by Amiibo ID."""
+    scores, diffs, wins, buchholz = {}, {}, {}, {}
+    for s in SwissStanding.query.all():
+        scores[s.amiibo_id] = points(s.score)
+        diffs[s.amiibo_id] = s.diff
+        wins[s.amiibo_id] = s.wins
+        buchholz[s.amiibo_id] = points(s.buchholz)
+    return scores, diffs, wins, buchholz
+
+def swiss_opponents(ids):
+    """Return the opponent sets of ``ids`` from reported Swiss pairings."""
+    opponents = {pid: set() for pid in ids}
+    involved = SwissPairing.player1_id.in_(ids) | SwissPairing.player2_id.in_(ids)
+    for p in SwissPairing.query.filter(involved):
+        if not p.points:
+            continue
+        if p.player1_id in opponents:
+            opponents[p.player1_id].add(p.player2_id)
+        if p.player2_id in opponents:
+            opponents[p.player2_id].add(p.player1_id)
+    return opponents
 
-        ss_raw = get_state('swiss_scores', {})
-        swiss_scores = {int(k): v for k, v in ss_raw.items()}
+def update_buchholz(gains, opponents, new_pair=None):
+    """Apply the Buchholz changes of new Swiss points to the stored standings.
 
-        swiss_diff = {int(k): v for k, v in get_state('swiss_diff', {}).items()}
-        swiss_wins = {int(k): v for k, v in get_state('swiss_wins', {}).items()}
-        so_raw = get_state('swiss_opponents', {})
-        swiss_opponents = {int(k): set(map(int, v)) for k, v in so_raw.items()}
+    ``opponents`` must be read before the new pairing is marked as played.
+    """
+    scores = {pid: swiss_standing(pid).score for pid in gains}
+    deltas = standings.buchholz_update(gains, opponents, scores, new_pair)
+    for s in SwissStanding.query.filter(SwissStanding.amiibo_id.in_(deltas)):
+        s.buchholz += deltas[s.amiibo_id]
+
+def load_swiss_history():
+    """Return ``(previous_matches, opponents)`` from reported Swiss pairings."""
+    previous = set()
+    opponents = {}
+    played = SwissPairing.query.filter(SwissPairing.draw | SwissPairing.winner_id.isnot(None))
+    for p in played:
+        previous.add((p.player1_id, p.player2_id))
+        opponents.setdefault(p.player1_id, set()).add(p.player2_id)
+        opponents.setdefault(p.player2_id, set()).add(p.player1_id)
+    return previous, opponents
+
+def swiss_pairs(round_no):
+    """Return the ``(p1, p2, result)`` pairings of a Swiss round."""
+    query = SwissPairing.query.filter_by(round_no=round_no).order_by(SwissPairing.id)
+    return [p.pairing for p in query]
+
+def load_league_state():
+    """Return ``(matches, scores, diff, wins, sb, results)`` for the current season.
+
+    The dictionaries keep the shapes of the former in-memory structures;
+    ``sb`` holds the stored Sonneborn-Berger values and ``results`` lists
+    ``(opponent, points)`` per player, derived from the reported fixtures.
+    """
+    matches, scores, diffs, wins, sb, results = {}, {}, {}, {}, {}, {}
+    for s in LeagueStanding.query.order_by(LeagueStanding.id):
+        scores.setdefault(s.league, {})[s.amiibo_id] = points(s.score)
+        diffs.setdefault(s.league, {})[s.amiibo_id] = s.diff
+        wins.setdefault(s.league, {})[s.amiibo_id] = s.wins
+        sb.setdefault(s.league, {})[s.amiibo_id] = points(s.sonneborn_berger)
+    for f in LeagueFixture.query.order_by(LeagueFixture.id):
+        matches.setdefault(f.league, {}).setdefault(f.round_no, []).append(f.pairing)
+        if f.points:
+            pts1, pts2 = f.points
+            results.setdefault(f.player1_id, []).append((f.player2_id, pts1))
+            results.setdefault(f.player2_id, []).append((f.player1_id, pts2))
+    return matches, scores, diffs, wins, sb, results
+
+def league_results_against(ids):
+    """Return ``(player, opponent, points)`` for reported fixtures against ``ids``."""
+    earlier = []
+    involved = LeagueFixture.player1_id.in_(ids) | LeagueFixture.player2_id.in_(ids)
+    for f in LeagueFixture.query.filter(involved):
+        if not f.points:
+            continue
+        pts1, pts2 = f.points
+        if f.player2_id in ids:
+            earlier.append((f.player1_id, f.player2_id, pts1))
+        if f.player1_id in ids:
+            earlier.append((f.player2_id, f.player1_id, pts2))
+    return earlier
+
+def load_knockout_state():
+    """Return ``(history, champions)`` keyed by bracket.
+
+    ``history`` lists the rounds of each bracket as ``(p1, p2, result)``
+    tuples in slot order; ``champions`` maps to the winner's ID or ``None``.
+    """
+    history = {}
+    champions = {}
+    for b in KnockoutBracket.query.order_by(KnockoutBracket.key):
+        history[b.key] = []
+        champions[b.key] = b.champion_id
+    query = KnockoutMatch.query.order_by(
+        KnockoutMatch.bracket, KnockoutMatch.round_no, KnockoutMatch.slot, KnockoutMatch.id
+    )
+    for m in query:
+        rounds = history.setdefault(m.bracket, [])
+        while len(rounds) < m.round_no:
+            rounds.append([])
+        rounds[m.round_no - 1].append(m.pairing)
+    return history, champions
 
-        prev_raw = get_state('swiss_previous_matches', [])
-        swiss_previous_matches = {tuple(map(int, p)) for p in prev_raw}
+def load_season_winners(ids):
+    """Return league winner and knockout champion rows of the given seasons.
 
-        lm_raw = get_state('league_matches', {})
-        league_matches = {
-            g: {int(r): [tuple(p) for p in ms] for r, ms in rounds.items()}
-            for g, rounds in lm_raw.items()
-        }
+    The Amiibos involved are loaded into the request cache as well.
+    """
+    winners = (
+        SeasonStanding.query
+        .filter(SeasonStanding.season_id.in_(ids), SeasonStanding.position == 1)
+        .order_by(SeasonStanding.league)
+        .all()
+    )
+    champions = (
+        SeasonChampion.query
+        .filter(SeasonChampion.season_id.in_(ids))
+        .order_by(SeasonChampion.bracket)
+        .all()
+    )
+    load_amiibos([w.amiibo_id for w in winners] + [c.amiibo_id for c in champions])
+    return winners, champions
+
+def serialized_write(view):
+    """Run a write endpoint as one transaction, retrying on lost races.
+
+    The tournament version is read before the handler looks at any state.
+    If another worker commits first the transaction is rolled back and the
+    handler runs again against the fresh state, backing off with jitter.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        for attempt in range(WRITE_RETRIES):
+            g.pop('state_writes', None)
+            g.pop('amiibo_cache', None)
+            g.pop('action_id', None)
+            g.pop('snapshot_due', None)
+            g.state_version = get_state('version', 0)
+            try:
+                return view(*args, **kwargs)
+            except (StateConflict, StaleDataError, OperationalError) as exc:
+                db.session.rollback()
+                if isinstance(exc, OperationalError) and 'locked' not in str(exc):
+                    raise
+            time.sleep(retry_jitter.uniform(0, 0.01 * 2 ** attempt))
+        abort(409)
+    return wrapper
+
+class PageCache:
+    """Thread-safe LRU of rendered page bodies."""
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.pages = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            body = self.pages.get(key)
+            if body is not None:
+                self.pages.move_to_end(key)
+            return body
+
+    def put(self, key, body):
+        with self.lock:
+            self.pages[key] = body
+            self.pages.move_to_end(key)
+            while len(self.pages) > self.maxsize:
+                self.pages.popitem(last=False)
+
+
+page_cache = PageCache(PAGE_CACHE_SIZE)
+
+def data_version():
+    """Return the data version and when it was last bumped (or None)."""
+    rows = dict(db.session.execute(
+        select(State.key, State.value).where(State.key.in_(('version', 'modified_at')))
+    ).all())
+    modified = rows.get('modified_at')
+    if modified is not None:
+        modified = datetime.fromtimestamp(json.loads(modified), timezone.utc)
+    return json.loads(rows.get('version', '0')), modified
+
+def cached_page(view):
+    """Serve a read view with ETag/Last-Modified and the rendered-page cache.
+
+    Every write bumps the data version, so a client revalidating an
+    unchanged page gets a 304 without rendering, and other clients share
+    the body rendered once for that version.
+    """
+    @functools.wraps(view)
+    def wrapper(*args, **kwargs):
+        version, modified = data_version()
+        etag = f'{BOOT_ID}-{version}'
+        if not is_resource_modified(request.environ, etag=etag, last_modified=modified):
+            response = app.response_class(status=304)
+        else:
+            key = (request.path, tuple(sorted(request.args.items(multi=True))), version)
+            body = page_cache.get(key)
+            if body is None:
+                body = view(*args, **kwargs)
+                page_cache.put(key, body)
+            response = app.make_response(body)
+        response.set_etag(etag)
+        if modified is not None:
+            response.last_modified = modified
+        response.cache_control.no_cache = True
+        return response
+    return wrapper
+
+def publish(kind, payload):
+    """Queue a live feed event; it is sent once the caller commits.
+
+    Replaying the action log publishes nothing: its events went out when
+    the actions were first applied.
+    """
+    if g.get('replaying'):
+        return
+    db.session.add(LiveEvent(kind=kind, payload=json.dumps(payload)))
 
-        ls_raw = get_state('league_scores', {})
-        league_scores = {g: {int(pid): sc for pid, sc in d.items()} for g, d in ls_raw.items()}
+def load_events(after, limit=500, through=None):
+    """Return ``(id, kind, payload)`` of stored events newer than ``after``.
 
-        ld_raw = get_state('league_diff', {})
-        league_diff = {g: {int(pid): val for pid, val in d.items()} for g, d in ld_raw.items()}
-        lw_raw = get_state('league_wins', {})
-        league_wins = {g: {int(pid): val for pid, val in d.items()} for g, d in lw_raw.items()}
-        lr_raw = get_state('league_results', {})
-        league_results = {int(pid): [(int(o), r) for o, r in lst] for pid, lst in lr_raw.items()}
+    ``through`` caps the ids, e.g. at the feed's cursor.
+    """
+    query = select(LiveEvent.id, LiveEvent.kind, LiveEvent.payload).where(LiveEvent.id > after)
+    if through is not None:
+        query = query.where(LiveEvent.id <= through)
+    rows = db.session.execute(query.order_by(LiveEvent.id).limit(limit)).all()
+    # hand the connection back, listeners hold their session for hours
+    db.session.close()
+    return [tuple(row) for row in rows]
+
+class EventFeed:
+    """Fan-out of new LiveEvent rows to every /events listener.
+
+    A single poller thread per process reads new rows while anyone is
+    listening and wakes all listeners, so the database is polled once no
+    matter how many clients are connected. Listeners behind the in-memory
+    buffer catch up from the table.
+
+    Ids are handed out before commit, and on databases with concurrent
+    writers (PostgreSQL) a lower id can become visible after a higher one.
+    The cursor therefore only moves over consecutive ids; a missing id is
+    waited for ``LIVE_GAP_WAIT`` seconds before it is taken as rolled back.
+    """
 
-        kb_raw = get_state('knockout_brackets', {})
-        knockout_brackets = {k: [tuple(p) for p in ps] for k, ps in kb_raw.items()}
+    def __init__(self, size):
+        self.events = deque(maxlen=size)
+        # every event after ``floor`` is in the buffer
+        self.floor = None
+        # the newest id delivered; nothing at or below it is still to come
+        self.last = None
+        # first missing id and when it was first seen missing
+        self.gap = None
+        self.gap_seen = 0
+        self.listeners = 0
+        self.poller = None
+        self.cond = threading.Condition()
+
+    def subscribe(self):
+        with self.cond:
+            self.listeners += 1
+            if self.poller is None:
+                self.poller = threading.Thread(target=self.poll, daemon=True)
+                self.poller.start()
+
+    def unsubscribe(self):
+        with self.cond:
+            self.listeners -= 1
+
+    def poll(self):
+        with app.app_context():
+            last = db.session.scalar(select(func.max(LiveEvent.id))) or 0
+            db.session.close()
+            with self.cond:
+                self.events.clear()
+                self.floor = self.last = last
+                self.cond.notify_all()
+            while True:
+                with self.cond:
+                    if not self.listeners:
+                        self.poller = None
+                        self.floor = self.last = None
+                        self.events.clear()
+                        return
+                rows, cursor = self.settle(load_events(last), last, time.monotonic())
+                if cursor == last:
+                    time.sleep(LIVE_POLL_INTERVAL)
+                    continue
+                last = cursor
+                with self.cond:
+                    for row in rows:
+                        if len(self.events) == self.events.maxlen:
+                            self.floor = self.events[0][0]
+                        self.events.append(row)
+                    self.last = last
+                    self.cond.notify_all()
+
+    def settle(self, rows, last, now):
+        """Return the rows of ``rows`` that can be delivered and the new cursor.
+
+        Rows are taken while their ids follow on from ``last``. At a gap
+        the cursor stops until the gap has been open ``LIVE_GAP_WAIT``
+        seconds, then steps over the missing ids.
+        """
+        ready = []
+        for row in rows:
+            if row[0] != last + 1:
+                break
+            ready.append(row)
+            last = row[0]
+        if len(ready) < len(rows):
+            if self.gap != last + 1:
+                self.gap, self.gap_seen = last + 1, now
+            elif now - self.gap_seen >= LIVE_GAP_WAIT:
+                # never committed; the next poll continues after the missing ids
+                last = rows[len(ready)][0] - 1
+        return ready, last
+
+    def wait(self, after, timeout):
+        """Return buffered events newer than ``after``, waiting up to ``timeout``.
+
+        Returns None when the buffer no longer reaches back to ``after``.
+        """
+        with self.cond:
+            if self.floor is None or not self.newer(after):
+                self.cond.wait(timeout)
+            if self.floor is not None and after < self.floor:
+                return None
+            return self.newer(after)
+
+    def newer(self, after):
+        found = []
+        for row in reversed(self.events):
+            if row[0] <= after:
+                break
+            found.append(row)
+        return found[::-1]
 
-        kr_raw = get_state('knockout_remaining', {})
-        knockout_remaining = {k: [int(pid) for pid in lst] for k, lst in kr_raw.items()}
 
-        kh_raw = get_state('knockout_history', {})
-        knockout_history = {
-            k: [[tuple(p) for p in rnd] for rnd in rounds]
-            for k, rounds in kh_raw.items()
-        }
+live_feed = EventFeed(LIVE_BUFFER)
 
-    def save_all_state():
-        """Persist in-memory state to the database."""
-        set_state('current_pairs', current_pairs)
-        set_state('current_swiss_pairs', current_swiss_pairs)
-        set_state('swiss_round', swiss_round)
-        set_state('swiss_scores', swiss_scores)
-        set_state('swiss_diff', swiss_diff)
-        set_state('swiss_wins', swiss_wins)
-        set_state('swiss_opponents', {k: list(v) for k, v in swiss_opponents.items()})
-        set_state('swiss_previous_matches', [list(p) for p in swiss_previous_matches])
-        set_state(
-            'league_matches',
-            {
-                g: {r: [list(p) for p in ms] for r, ms in rounds.items()}
-                for g, rounds in league_matches.items()
-            },
-        )
-        set_state('league_scores', league_scores)
-        set_state('league_diff', league_diff)
-        set_state('league_wins', league_wins)
-        set_state('league_results', {pid: [(o, r) for o, r in lst] for pid, lst in league_results.items()})
-        set_state('knockout_brackets', {k: [list(p) for p in ps] for k, ps in knockout_brackets.items()})
-        set_state('knockout_remaining', knockout_remaining)
-        set_state('knockout_history', {
-            k: [[list(p) for p in rnd] for rnd in rounds]
-            for k, rounds in knockout_history.items()
-        })
-        db.session.commit()
+def sse_message(row):
+    event_id, kind, payload = row
+    return f'id: {event_id}\nevent: {kind}\ndata: {payload}\n\n'
 
-    load_all_state()
-    # ensure the 'waiting' column exists if database was created before
-    try:
-        db.session.execute(text('SELECT waiting FROM amiibo LIMIT 1'))
-    except Exception:
-        db.session.execute(text('ALTER TABLE amiibo ADD COLUMN waiting BOOLEAN DEFAULT 0'))
-        db.session.commit()
-    # ensure the 'draw' column exists in matches
-    try:
-        db.session.execute(text('SELECT draw FROM match LIMIT 1'))
-    except Exception:
-        db.session.execute(text('ALTER TABLE match ADD COLUMN draw BOOLEAN DEFAULT 0'))
-        db.session.commit()
-    # ensure 'profile_pic' column exists
-    try:
-        db.session.execute(text('SELECT profile_pic FROM amiibo LIMIT 1'))
-    except Exception:
-        db.session.execute(text("ALTER TABLE amiibo ADD COLUMN profile_pic VARCHAR(120) DEFAULT ''"))
-        db.session.commit()
-    # ensure score columns exist
+@app.route('/events')
+def events():
+    """Stream result and round events as server-sent events.
+
+    Clients resume with ``Last-Event-ID`` (sent by EventSource on reconnect)
+    or ``?after=<id>``; without either only new events are sent.
+    """
+    after = request.headers.get('Last-Event-ID', request.args.get('after'))
     try:
-        db.session.execute(text('SELECT score1 FROM match LIMIT 1'))
-    except Exception:
-        db.session.execute(text('ALTER TABLE match ADD COLUMN score1 INTEGER DEFAULT 0'))
-        db.session.execute(text('ALTER TABLE match ADD COLUMN score2 INTEGER DEFAULT 0'))
-        db.session.commit()
+        after = int(after)
+    except (TypeError, ValueError):
+        after = db.session.scalar(select(func.max(LiveEvent.id))) or 0
+    db.session.close()
+
+    def stream(after):
+        live_feed.subscribe()
+        try:
+            yield f'retry: {int(LIVE_HEARTBEAT * 1000)}\n\n'
+            while True:
+                rows = live_feed.wait(after, LIVE_HEARTBEAT)
+                if rows is None:
+                    # stay behind the feed's cursor, past it ids may still be missing
+                    rows = load_events(after, through=live_feed.last)
+                if not rows:
+                    yield ': keep-alive\n\n'
+                    continue
+                for row in rows:
+                    yield sse_message(row)
+                after = rows[-1][0]
+        finally:
+            live_feed.unsubscribe()
+
+    response = app.response_class(stream_with_context(stream(after)), mimetype='text/event-stream')
+    response.cache_control.no_cache = True
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
 
 @app.route('/logo/<path:filename>')
 def serve_logo(filename):
@@ -165,21 +647,82 @@ def serve_logo(filename):
 
 @app.route('/profile/<path:filename>')
 def serve_profile(filename):
-    """Serve profile pictures."""
-    return send_from_directory('profile', filename)
-
-# Simple ELO update function
-K = 32
+    """Serve profile pictures; content-hashed variants are cached for good."""
+    stem, ext = os.path.splitext(filename)
+    if not PROFILE_NAME.fullmatch(stem.rpartition('-')[0] + ext):
+        return send_from_directory('profile', filename)
+    response = send_from_directory('profile', filename, max_age=PROFILE_MAX_AGE)
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+@app.template_global()
+def profile_url(amiibo, size):
+    """URL of an Amiibo's picture in one of ``PROFILE_SIZES``, or None."""
+    pic = amiibo.profile_pic
+    if not pic:
+        return None
+    if not PROFILE_NAME.fullmatch(pic):
+        # uploaded before pictures were processed
+        return f'/profile/{pic}'
+    stem, ext = os.path.splitext(pic)
+    return f'/profile/{stem}-{size}{ext}'
+
+def store_profile_picture(data, filename):
+    """Write every size of an uploaded picture to ``profile/``.
+
+    Returns the stored name (content hash plus extension), or None if the
+    upload is not a readable image. Without Pillow the original is kept
+    under each size name.
+    """
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    os.makedirs('profile', exist_ok=True)
+    if Image is None:
+        ext = os.path.splitext(secure_filename(filename))[1].lower() or '.img'
+        for size in PROFILE_SIZES:
+            with open(os.path.join('profile', f'{digest}-{size}{ext}'), 'wb') as out:
+                out.write(data)
+        return digest + ext
+    try:
+        image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    except (OSError, Image.DecompressionBombError):
+        return None
+    image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    for size, (pixels, crop) in PROFILE_SIZES.items():
+        if crop:
+            variant = ImageOps.fit(image, (pixels, pixels))
+        else:
+            variant = image.copy()
+            variant.thumbnail((pixels, pixels))
+        variant.save(os.path.join('profile', f'{digest}-{size}.webp'), 'WEBP', quality=85)
+    return digest + '.webp'
+
+def remove_profile_picture(pic):
+    """Delete the files of a picture no Amiibo uses any more."""
+    if not pic or Amiibo.query.filter_by(profile_pic=pic).first():
+        return
+    if PROFILE_NAME.fullmatch(pic):
+        stem, ext = os.path.splitext(pic)
+        names = [f'{stem}-{size}{ext}' for size in PROFILE_SIZES]
+    else:
+        names = [pic]
+    for name in names:
+        try:
+            os.remove(os.path.join('profile', name))
+        except FileNotFoundError:
+            pass
 
 def update_elo(player1: Amiibo, player2: Amiibo, score1: float):
     """Update ratings given score for player1 (1=win, 0=loss, 0.5=draw)."""
-    expected1 = 1 / (1 + 10 ** ((player2.current_elo - player1.current_elo) / 400))
-    expected2 = 1 - expected1
-    player1.current_elo += int(K * (score1 - expected1))
-    player2.current_elo += int(K * ((1 - score1) - expected2))
+    player1.current_elo, player2.current_elo = elo_update(
+        player1.current_elo, player2.current_elo, score1
+    )
     for p in (player1, player2):
         if p.current_elo > p.peak_elo:
-            p.peak_elo = p.current_elo
+            old_peak, p.peak_elo = p.peak_elo, p.current_elo
+            # the title only depends on peak Elo through a few thresholds
+            if crosses_title_elo(old_peak, p.peak_elo):
+                refresh_titles([p.id])
 
 def record_match(
     player1_id: int,
@@ -187,6 +730,7 @@ def record_match(
     score1: int,
     score2: int,
     round_no: int | None = None,
+    context: dict | None = None,
 ) -> tuple[int | None, bool]:
     """Apply a result and persist the match.
 
@@ -198,27 +742,30 @@ def record_match(
         Numeric result for player1 and player2.
     round_no:
         Optional round number for Swiss/league matches.
+    context:
+        Where the result belongs, e.g. ``{'type': 'league', 'league': 'A'}``,
+        sent with the live ``result`` event; friendlies by default.
 
     Returns
     -------
     tuple
         ``(winner_id, draw)`` describing the stored result.
+
+    The caller commits, so the match and any tournament state it updates
+    are stored in one transaction.
     """
 
+    batched = rating_backend().batched
     a1 = Amiibo.query.get(player1_id)
     a2 = Amiibo.query.get(player2_id)
     if score1 == score2:
-        update_elo(a1, a2, 0.5)
         winner_id = None
         draw = True
-    elif score1 > score2:
-        update_elo(a1, a2, 1)
-        winner_id = player1_id
-        draw = False
     else:
-        update_elo(a1, a2, 0)
-        winner_id = player2_id
+        winner_id = player1_id if score1 > score2 else player2_id
         draw = False
+    if not batched:
+        update_elo(a1, a2, 0.5 if draw else 1 if winner_id == player1_id else 0)
     match = Match(
         player1_id=player1_id,
         player2_id=player2_id,
@@ -230,79 +777,211 @@ def record_match(
     if round_no is not None:
         match.round_no = round_no
     db.session.add(match)
-    db.session.commit()
+    db.session.flush()
+    if not batched:
+        db.session.add_all([
+            RatingHistory(amiibo_id=a1.id, match_id=match.id, rating=a1.current_elo),
+            RatingHistory(amiibo_id=a2.id, match_id=match.id, rating=a2.current_elo),
+        ])
+        db.session.flush()
+    # a batched backend rates the match when its period closes, which
+    # publishes 'ratings'; until then a rating here would be the old one
+    publish('result', {
+        'match_id': match.id,
+        'round': round_no,
+        'players': [
+            {'id': a.id, 'name': a.name, 'score': score, 'rating': None if batched else a.current_elo}
+            for a, score in ((a1, score1), (a2, score2))
+        ],
+        'rated': not batched,
+        'winner_id': winner_id,
+        'draw': draw,
+        'context': context or {'type': 'friendly'},
+    })
     return winner_id, draw
 
+def rating_backend():
+    """Return the rating backend selected by ``RATING_BACKEND``."""
+    return BACKENDS[app.config['RATING_BACKEND']]
+
+def close_rating_period():
+    """Rate all matches reported since the last period in one batch.
+
+    Only batched backends (Glicko-2) defer ratings; for Elo every match is
+    already rated when it is recorded. Periods end with a Swiss round,
+    league matchday or knockout round, so friendlies are rated with the
+    next one and idle players' deviation grows once per real period.
+    Participants get their new rating in ``current_elo``/``peak_elo`` and
+    one history row per match.
+    """
+    backend = rating_backend()
+    if not backend.batched:
+        return
+    through = get_state('rated_through', None)
+    if through is None:
+        # matches rated before switching backends already have history
+        through = db.session.scalar(select(func.max(RatingHistory.match_id))) or 0
+    games = db.session.execute(
+        select(Match.id, Match.player1_id, Match.player2_id, Match.score1, Match.score2)
+        .where(Match.id > through)
+        .order_by(Match.id)
+    ).all()
+    if not games:
+        return
+    players = {pid for _, p1, p2, _, _ in games for pid in (p1, p2)}
+    load_amiibos(players)
+    states = {
+        r.amiibo_id: (r.rating, r.deviation, r.volatility)
+        for r in GlickoRating.query.all()
+    }
+    for pid in players - states.keys():
+        states[pid] = (float(get_amiibo(pid).current_elo), INITIAL_DEVIATION, INITIAL_VOLATILITY)
+    updated = backend.rate_period(states, [row[1:] for row in games])
+    stmt = upsert(GlickoRating, ['amiibo_id'], ['rating', 'deviation', 'volatility'])
+    db.session.execute(stmt, [
+        {'amiibo_id': pid, 'rating': r, 'deviation': rd, 'volatility': vol}
+        for pid, (r, rd, vol) in updated.items()
+    ])
+    promoted = []
+    for pid in players:
+        a = get_amiibo(pid)
+        a.current_elo = round(updated[pid][0])
+        if crosses_title_elo(a.peak_elo, a.current_elo):
+            promoted.append(pid)
+        a.peak_elo = max(a.peak_elo, a.current_elo)
+    if promoted:
+        refresh_titles(promoted)
+    db.session.execute(insert(RatingHistory), [
+        {'amiibo_id': pid, 'match_id': mid, 'rating': round(updated[pid][0])}
+        for mid, p1, p2, _, _ in games
+        for pid in (p1, p2)
+    ])
+    set_state('rated_through', games[-1][0])
+    publish('ratings', {str(pid): get_amiibo(pid).current_elo for pid in sorted(players)})
+
+@app.cli.command('backfill-rating-history')
+def backfill_rating_history():
+    """Rebuild the rating history table by replaying every match."""
+    log = load_match_log()
+    _, _, after1, after2 = replay(log)
+    written = write_rating_history(log, after1, after2)
+    log_action('backfill_rating_history', {})
+    g.state_version = get_state('version', 0)
+    g.snapshot_due = True
+    save_state()
+    print(f'Wrote {written} rating history rows.')
+
+@app.cli.command('rebuild-ratings')
+@click.option('--k', default=K, show_default=True, help='Elo K-factor to replay with.')
+def rebuild_ratings(k):
+    """Recompute current and peak Elo and the rating history from the match log."""
+    if rating_backend().batched:
+        raise click.ClickException('rebuild-ratings replays Elo; set RATING_BACKEND to elo')
+    log = load_match_log()
+    current, peak, after1, after2 = replay(log, k)
+    players = write_ratings(current, peak)
+    written = write_rating_history(log, after1, after2)
+    refresh_titles()
+    log_action('rebuild_ratings', {'k': k})
+    # bump the data version so cached pages are re-rendered
+    g.state_version = get_state('version', 0)
+    # the change cannot be replayed, so replay has to start after it
+    g.snapshot_due = True
+    save_state()
+    print(f'Replayed {len(log[0])} matches for {players} Amiibos, wrote {written} rating history rows.')
+
+@app.cli.command('backfill-profile-pics')
+def backfill_profile_pics():
+    """Convert pictures uploaded before resizing into the sized variants."""
+    converted = []
+    for amiibo in Amiibo.query.filter(Amiibo.profile_pic != '').all():
+        pic = amiibo.profile_pic
+        path = os.path.join('profile', pic)
+        if PROFILE_NAME.fullmatch(pic) or not os.path.exists(path):
+            continue
+        with open(path, 'rb') as f:
+            stored = store_profile_picture(f.read(), pic)
+        if stored is None:
+            print(f'Skipped {pic}: not an image')
+            continue
+        amiibo.profile_pic = stored
+        converted.append(pic)
+    log_action('backfill_profile_pics', {'converted': converted})
+    g.state_version = get_state('version', 0)
+    g.snapshot_due = True
+    save_state()
+    for pic in converted:
+        remove_profile_picture(pic)
+    print(f'Converted {len(converted)} profile pictures.')
+
 def generate_swiss_pairs(players, previous_matches):
-    """Pair players for a Swiss round avoiding rematches."""
-    unpaired = players[:]
-    pairs = []
-    while len(unpaired) > 1:
-        p1 = unpaired.pop(0)
-        idx = None
-        for i, p2 in enumerate(unpaired):
-            if (p1.id, p2.id) not in previous_matches and (p2.id, p1.id) not in previous_matches:
-                idx = i
-                break
-        if idx is None:
-            p2 = unpaired.pop(0)
-        else:
-            p2 = unpaired.pop(idx)
-        pairs.append((p1.id, p2.id, None))
-    # bye if odd number of players
-    if unpaired:
-        bye = unpaired.pop(0)
-        swiss_scores[bye.id] += 1
-    return pairs
+    """Pair players (in ranking order) for a Swiss round avoiding rematches.
+
+    With an odd field the bye is worth a point and goes to the lowest
+    ranked player who has not had one yet.
+    """
+    byes = get_state('swiss_byes', [])
+    pairs, bye = pair_round([p.id for p in players], previous_matches, byes)
+    if bye is not None:
+        swiss_standing(bye).score += 1
+        update_buchholz({bye: 1}, swiss_opponents([bye]))
+        set_state('swiss_byes', byes + [bye])
+    return [(p1, p2, None) for p1, p2 in pairs]
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def leaderboard_amiibos():
+    """Return Amiibos by rating; ``?title=GM`` filters and ``?sort=title`` ranks titles first."""
+    query = Amiibo.query
+    title = request.args.get('title')
+    if title:
+        query = query.filter(Amiibo.title == title)
+    if request.args.get('sort') == 'title':
+        query = query.order_by(title_rank.desc(), Amiibo.current_elo.desc())
+    else:
+        query = query.order_by(Amiibo.current_elo.desc())
+    return query.all()
+
 @app.route('/leaderboard', methods=['GET'])
+@cached_page
 def leaderboard():
     last = request.args.get('last', type=int)
-    amiibos = Amiibo.query.order_by(Amiibo.current_elo.desc()).all()
+    amiibos = leaderboard_amiibos()
     podium = amiibos[:3]
-    return render_template('leaderboard.html', amiibos=amiibos, podium=podium, last=last)
+    records = match_records(last)
+    win_pct = {a.id: win_percentage(*records.get(a.id, (0, 0, 0))) for a in amiibos}
+    return render_template(
+        'leaderboard.html',
+        amiibos=amiibos,
+        podium=podium,
+        last=last,
+        win_pct=win_pct,
+        title=request.args.get('title', ''),
+        sort=request.args.get('sort', ''),
+    )
 
 @app.route('/amiibo/<int:amiibo_id>', methods=['GET'])
+@cached_page
 def amiibo_profile(amiibo_id):
     """Display detailed profile for an Amiibo."""
     amiibo = Amiibo.query.get_or_404(amiibo_id)
 
-    # compute rating history from match order
-    matches_all = Match.query.order_by(Match.id).all()
-    ratings = {a.id: 1500 for a in Amiibo.query.all()}
-    history_labels = [0]
-    history_values = [1500]
-    count = 0
-    for m in matches_all:
-        r1, r2 = ratings[m.player1_id], ratings[m.player2_id]
-        if m.draw:
-            score1 = 0.5
-        else:
-            score1 = 1 if m.winner_id == m.player1_id else 0
-        expected1 = 1 / (1 + 10 ** ((r2 - r1) / 400))
-        expected2 = 1 - expected1
-        r1 += int(K * (score1 - expected1))
-        r2 += int(K * ((1 - score1) - expected2))
-        ratings[m.player1_id] = r1
-        ratings[m.player2_id] = r2
-        if m.player1_id == amiibo_id:
-            count += 1
-            history_labels.append(count)
-            history_values.append(r1)
-        if m.player2_id == amiibo_id:
-            count += 1
-            history_labels.append(count)
-            history_values.append(r2)
+    history = (
+        RatingHistory.query.filter_by(amiibo_id=amiibo_id)
+        .order_by(RatingHistory.match_id)
+        .all()
+    )
+    history_labels = list(range(len(history) + 1))
+    history_values = [1500] + [h.rating for h in history]
 
     matches = Match.query.filter((Match.player1_id == amiibo_id) | (Match.player2_id == amiibo_id)).order_by(Match.id.desc()).all()
+    load_amiibos([m.player1_id for m in matches] + [m.player2_id for m in matches])
     display = []
     for m in matches:
         opp_id = m.player2_id if m.player1_id == amiibo_id else m.player1_id
-        opponent = Amiibo.query.get(opp_id)
+        opponent = get_amiibo(opp_id)
         if m.draw:
             result = 'Draw'
         else:
@@ -322,118 +1001,209 @@ def amiibo_profile(amiibo_id):
         show_all=show_all,
     )
 
-@app.route('/add_amiibo', methods=['POST'])
-def add_amiibo():
-    name = request.form['name']
+def csv_delimiter(lines: list[str]) -> str | None:
+    """Return the delimiter if ``lines`` look like CSV, else None.
+
+    Names may contain commas, so this needs a ``name`` header row or at
+    least two rows that all split into the same number of columns.
+    """
+    for delimiter in (',', ';'):
+        counts = {len(row) for row in csv.reader(lines, delimiter=delimiter)}
+        header = next(csv.reader(lines[:1], delimiter=delimiter), [''])[0].strip().lower()
+        if header == 'name':
+            return delimiter
+        if len(lines) > 1 and len(counts) == 1 and counts.pop() > 1:
+            return delimiter
+    return None
+
+def parse_import(raw: str, fmt: str = 'auto') -> list[str]:
+    """Split pasted import data into names, one per row.
+
+    ``fmt`` is ``'text'`` (one name per line), ``'csv'`` (name in the first
+    column, optional ``name`` header) or ``'json'`` (a list of names or of
+    objects with a ``name`` key). ``'auto'`` picks JSON or CSV when the
+    content clearly is one and one name per line otherwise. Raises
+    ValueError for JSON that is malformed or not a list of names.
+    """
+    stripped = raw.strip()
+    if fmt == 'auto':
+        lines = [line for line in stripped.splitlines() if line.strip()]
+        if stripped[:1] in ('[', '{'):
+            fmt = 'json'
+        elif lines and csv_delimiter(lines):
+            fmt = 'csv'
+        else:
+            fmt = 'text'
+    if fmt == 'json':
+        try:
+            data = json.loads(stripped or '[]')
+        except ValueError as exc:
+            raise ValueError(f'invalid JSON: {exc}') from exc
+        if isinstance(data, dict):
+            data = data.get('names', data.get('amiibos', []))
+        if not isinstance(data, list):
+            raise ValueError('expected a list of names')
+        names = [item.get('name') if isinstance(item, dict) else item for item in data]
+        if not all(isinstance(name, str) for name in names):
+            raise ValueError('every name must be a string')
+        return names
+    if fmt == 'csv':
+        first = stripped.split('\n', 1)[0]
+        delimiter = ';' if ';' in first and ',' not in first else ','
+        rows = [row[0] if row else '' for row in csv.reader(io.StringIO(stripped), delimiter=delimiter)]
+        if rows and rows[0].strip().lower() == 'name':
+            rows = rows[1:]
+        return rows
+    return raw.splitlines()
+
+def import_amiibos(names: list[str]) -> list[dict]:
+    """Insert new Amiibos in bulk and return one report entry per row.
+
+    Existing names and current group sizes are read with one query each,
+    leagues are filled in memory the same way single adds fill them and all
+    new rows go out in one bulk insert. Names that already exist (or repeat
+    within the batch) are reported as duplicates instead of failing the
+    whole import; blank rows are skipped.
+    """
+    report = []
+    wanted = []
+    for row, raw in enumerate(names, start=1):
+        name = raw.strip()
+        if name:
+            wanted.append((row, name))
+    existing = set()
+    unique_names = list({name for _, name in wanted})
+    for i in range(0, len(unique_names), 500):
+        chunk = unique_names[i:i + 500]
+        existing.update(n for (n,) in db.session.query(Amiibo.name).filter(Amiibo.name.in_(chunk)))
+
     cycle = league_cycle_running()
-    a = Amiibo(name=name, waiting=cycle)
     if not cycle:
-        players = Amiibo.query.filter_by(waiting=False).all()
-        groups = sorted(set(p.league for p in players if p.league))
-        if not groups:
-            target = 'A'
-            size = 0
-        else:
-            last = groups[-1]
-            size = sum(1 for p in players if p.league == last)
+        sizes = dict(
+            db.session.query(Amiibo.league, func.count())
+            .filter(Amiibo.waiting == False, Amiibo.league != '')  # noqa: E712
+            .group_by(Amiibo.league)
+        )
+        last = max(sizes) if sizes else 'A'
+        size = sizes.get(last, 0)
+
+    rows = []
+    for row, name in wanted:
+        if name in existing:
+            report.append({'row': row, 'name': name, 'status': 'duplicate', 'league': None})
+            continue
+        existing.add(name)
+        league = ''
+        if not cycle:
             if size >= 4:
-                target = chr(ord(last) + 1)
+                last = chr(ord(last) + 1)
                 size = 0
-            else:
-                target = last
-        a.league = target
-    db.session.add(a)
-    db.session.commit()
+            league = last
+            size += 1
+        rows.append({'name': name, 'waiting': cycle, 'league': league})
+        report.append({'row': row, 'name': name, 'status': 'added', 'league': league or None})
+    if rows:
+        db.session.execute(insert(Amiibo), rows)
+    return report
+
+@app.route('/add_amiibo', methods=['POST'])
+@serialized_write
+def add_amiibo():
+    run_action('add_amiibos', {'names': [request.form['name']]})
+    save_state()
     return redirect('/leaderboard')
 
 @app.route('/add_amiibos', methods=['POST'])
+@serialized_write
 def add_amiibos():
-    names = request.form['names']
-    for raw in names.splitlines():
-        name = raw.strip()
-        if not name:
-            continue
-        cycle = league_cycle_running()
-        a = Amiibo(name=name, waiting=cycle)
-        if not cycle:
-            players = Amiibo.query.filter_by(waiting=False).all()
-            groups = sorted(set(p.league for p in players if p.league))
-            if not groups:
-                target = 'A'
-                size = 0
-            else:
-                last = groups[-1]
-                size = sum(1 for p in players if p.league == last)
-                if size >= 4:
-                    target = chr(ord(last) + 1)
-                    size = 0
-                else:
-                    target = last
-            a.league = target
-        db.session.add(a)
-    db.session.commit()
-    return redirect('/leaderboard')
+    """Bulk import from pasted text, CSV or JSON.
+
+    Form posts get an HTML report; JSON requests (a list of names or
+    ``{"names": [...]}``) get the per-row report as JSON.
+    """
+    try:
+        if request.is_json:
+            names = parse_import(request.get_data(as_text=True), 'json')
+        else:
+            names = parse_import(request.form['names'], request.form.get('format', 'auto'))
+    except ValueError as exc:
+        if request.is_json:
+            return jsonify(error=str(exc)), 400
+        return render_template('import.html', rows=[], error=str(exc)), 400
+    report = run_action('add_amiibos', {'names': names})
+    save_state()
+    if request.is_json:
+        return jsonify(rows=report)
+    return render_template('import.html', rows=report)
 
 @app.route('/upload_pic/<int:amiibo_id>', methods=['POST'])
 def upload_pic(amiibo_id):
-    amiibo = Amiibo.query.get(amiibo_id)
-    if 'picture' not in request.files or not amiibo:
-        return redirect('/leaderboard')
-    file = request.files['picture']
-    if file.filename:
-        filename = secure_filename(file.filename)
-        os.makedirs('profile', exist_ok=True)
-        path = os.path.join('profile', filename)
-        file.save(path)
-        amiibo.profile_pic = filename
-        db.session.commit()
+    file = request.files.get('picture')
+    if file and file.filename and db.session.get(Amiibo, amiibo_id):
+        # the upload stream can be read once, so the files are written
+        # before the transaction that a lost race would run again
+        stored = store_profile_picture(file.read(), file.filename)
+        if stored:
+            try:
+                set_profile_pic(amiibo_id, stored)
+            except HTTPException:
+                remove_profile_picture(stored)
+                raise
     return redirect('/leaderboard')
 
+@serialized_write
+def set_profile_pic(amiibo_id, stored):
+    """Point an Amiibo at a stored picture and drop its previous one."""
+    amiibo = db.session.get(Amiibo, amiibo_id)
+    if amiibo and stored != amiibo.profile_pic:
+        previous = amiibo.profile_pic
+        run_action('profile_pic', {'amiibo_id': amiibo_id, 'profile_pic': stored})
+        save_state()
+        # only once committed, a retried request must still find them
+        remove_profile_picture(previous)
+
 def league_cycle_running() -> bool:
     """Return True if Swiss, league or knockout is active."""
-    return swiss_round > 0 or bool(league_matches) or bool(knockout_brackets)
+    return (
+        get_state('swiss_round', 0) > 0
+        or LeagueFixture.query.first() is not None
+        or KnockoutBracket.query.first() is not None
+    )
 
 @app.route('/match', methods=['GET'])
+@cached_page
 def match():
     players = Amiibo.query.order_by(Amiibo.name).all()
+    remember_amiibos(players)
     def resolve(m):
         if m.draw:
             return 'Draw'
-        return Amiibo.query.get(m.winner_id) if m.winner_id else None
+        return get_amiibo(m.winner_id)
     recent = Match.query.order_by(Match.id.desc()).limit(10).all()
-    pairs = [(Amiibo.query.get(m.player1_id), Amiibo.query.get(m.player2_id), resolve(m)) for m in recent]
+    pairs = [(get_amiibo(m.player1_id), get_amiibo(m.player2_id), resolve(m)) for m in recent]
     return render_template('match.html', players=players, pairs=pairs)
 
 @app.route('/report_match', methods=['POST'])
+@serialized_write
 def report_match():
-    p1 = int(request.form['player1'])
-    p2 = int(request.form['player2'])
-    score1 = int(request.form['score1'])
-    score2 = int(request.form['score2'])
-    record_match(p1, p2, score1, score2)
-    save_all_state()
+    run_action('match', result_payload(request.form))
+    save_state()
     return redirect('/match')
 
 
 @app.route('/swiss', methods=['GET'])
+@cached_page
 def swiss():
-    def resolve(w):
-        if w == 'draw':
-            return 'Draw'
-        return Amiibo.query.get(w) if w else None
-    pairs = [(Amiibo.query.get(p1), Amiibo.query.get(p2), resolve(w)) for p1, p2, w in current_swiss_pairs]
+    swiss_round = get_state('swiss_round', 0)
     players = Amiibo.query.all()
-    buchholz = {p.id: sum(swiss_scores.get(o, 0) for o in swiss_opponents.get(p.id, [])) for p in players}
-    ordered = sorted(
-        players,
-        key=lambda a: (
-            swiss_scores.get(a.id, 0),
-            swiss_diff.get(a.id, 0),
-            swiss_wins.get(a.id, 0),
-            buchholz[a.id],
-        ),
-        reverse=True,
-    )
+    remember_amiibos(players)
+    swiss_scores, swiss_diff, swiss_wins, swiss_buchholz = load_swiss_standings()
+    pairs = [(get_amiibo(p1), get_amiibo(p2), resolve_winner(w)) for p1, p2, w in swiss_pairs(swiss_round)]
+    buchholz = {p.id: swiss_buchholz.get(p.id, 0) for p in players}
+    ordered = [
+        get_amiibo(pid)
+        for pid in standings.rank([p.id for p in players], swiss_scores, swiss_diff, swiss_wins, buchholz)
+    ]
     done = swiss_round > 4
     current_round = min(swiss_round, 4)
     return render_template(
@@ -450,138 +1220,128 @@ def swiss():
 
 
 @app.route('/start_swiss', methods=['POST'])
+@serialized_write
 def start_swiss():
-    global current_swiss_pairs, swiss_round, swiss_scores, swiss_previous_matches
-    global swiss_diff, swiss_wins, swiss_opponents
+    run_action('start_swiss', {})
+    save_state()
+    return redirect('/swiss')
+
+
+def begin_swiss():
+    """Reset the Swiss standings and pair round 1 by Elo."""
     players = Amiibo.query.order_by(Amiibo.current_elo.desc()).all()
     swiss_round = 1
-    swiss_scores = {p.id: 0 for p in players}
-    swiss_diff = {p.id: 0 for p in players}
-    swiss_wins = {p.id: 0 for p in players}
-    swiss_opponents = {p.id: set() for p in players}
-    swiss_previous_matches = set()
-    current_swiss_pairs = generate_swiss_pairs(players, swiss_previous_matches)
-    save_all_state()
-    return redirect('/swiss')
+    SwissPairing.query.delete()
+    SwissStanding.query.delete()
+    db.session.add_all(SwissStanding(amiibo_id=p.id, score=0, diff=0, wins=0, buchholz=0) for p in players)
+    db.session.flush()
+    set_state('swiss_byes', [])
+    for p1, p2, _ in generate_swiss_pairs(players, set()):
+        db.session.add(SwissPairing(round_no=swiss_round, player1_id=p1, player2_id=p2))
+    set_state('swiss_round', swiss_round)
 
 
-@app.route('/report_swiss_result', methods=['POST'])
-def report_swiss_result():
-    global current_swiss_pairs, swiss_scores, swiss_round, swiss_previous_matches
-    global swiss_diff, swiss_wins, swiss_opponents
-    p1 = int(request.form['player1'])
-    p2 = int(request.form['player2'])
-    score1 = int(request.form['score1'])
-    score2 = int(request.form['score2'])
-    winner_id, draw = record_match(p1, p2, score1, score2, swiss_round)
+def apply_swiss_result(swiss_round, p1, p2, score1, score2, strict=False):
+    """Record a Swiss result and update standings and the pairing.
+
+    With ``strict`` the pairing must be an open pairing of ``swiss_round``,
+    otherwise ValueError is raised before anything is written.
+    """
+    pairing = SwissPairing.query.filter_by(round_no=swiss_round, player1_id=p1, player2_id=p2).first()
+    if strict and (pairing is None or pairing.result is not None):
+        raise ValueError(f'no open Swiss pairing {p1} vs {p2} in round {swiss_round}')
+    opponents = swiss_opponents([p1, p2])
+    winner_id, draw = record_match(p1, p2, score1, score2, swiss_round, {'type': 'swiss'})
+    s1, s2 = swiss_standing(p1), swiss_standing(p2)
     if draw:
-        swiss_scores[p1] += 0.5
-        swiss_scores[p2] += 0.5
+        gains = {p1: 0.5, p2: 0.5}
     else:
-        swiss_scores[winner_id] += 1
-        swiss_wins[winner_id] += 1
-    swiss_diff[p1] += score1 - score2
-    swiss_diff[p2] += score2 - score1
-    swiss_opponents.setdefault(p1, set()).add(p2)
-    swiss_opponents.setdefault(p2, set()).add(p1)
-    swiss_previous_matches.add((p1, p2))
-    result_flag = 'draw' if draw else winner_id
-    current_swiss_pairs = [ (pp1, pp2, w if (pp1, pp2) != (p1, p2) else result_flag) for pp1, pp2, w in current_swiss_pairs]
-
-    if all(w for _,_,w in current_swiss_pairs):
-        if swiss_round >= 4:
-            swiss_round += 1
-            players = Amiibo.query.all()
-            buchholz = {
-                p.id: sum(
-                    swiss_scores.get(o, 0) for o in swiss_opponents.get(p.id, [])
-                )
-                for p in players
-            }
-            players = sorted(
-                players,
-                key=lambda a: (
-                    swiss_scores.get(a.id, 0),
-                    swiss_diff.get(a.id, 0),
-                    swiss_wins.get(a.id, 0),
-                    buchholz[a.id],
-                ),
-                reverse=True,
-            )
-            total = len(players)
-            num_groups = (total + 3) // 4
-            groups = [chr(ord('A') + i) for i in range(num_groups)]
-            league_matches.clear()
-            league_scores.clear()
-            league_diff.clear()
-            league_wins.clear()
-            league_results.clear()
-            for idx, p in enumerate(players):
-                gi = idx // 4
-                if gi >= num_groups:
-                    gi = num_groups - 1
-                league = groups[gi]
-                p.league = league
-                league_scores.setdefault(league, {})[p.id] = 0
-                league_diff.setdefault(league, {})[p.id] = 0
-                league_wins.setdefault(league, {})[p.id] = 0
-            db.session.commit()
-            for league in groups:
-                players_in_league = [pl for pl in players if pl.league == league]
-                ids = [pl.id for pl in players_in_league]
-                rounds = {}
-                if len(ids) % 2 == 1:
-                    ids.append(None)
-                n = len(ids)
-                for r in range(n - 1):
-                    pairings = []
-                    for i in range(n // 2):
-                        p1 = ids[i]
-                        p2 = ids[n - 1 - i]
-                        if p1 is not None and p2 is not None:
-                            pairings.append((p1, p2, None))
-                    rounds[r + 1] = pairings
-                    ids = [ids[0]] + [ids[-1]] + ids[1:-1]
-                league_matches[league] = rounds
-            current_swiss_pairs = []
-        else:
-            swiss_round += 1
-            players = sorted(Amiibo.query.all(), key=lambda a: (-swiss_scores.get(a.id, 0), a.current_elo))
-            current_swiss_pairs = generate_swiss_pairs(players, swiss_previous_matches)
-    save_all_state()
+        gains = {p1: 1, p2: 0} if winner_id == p1 else {p1: 0, p2: 1}
+        swiss_standing(winner_id).wins += 1
+    s1.score += gains[p1]
+    s2.score += gains[p2]
+    s1.diff += score1 - score2
+    s2.diff += score2 - score1
+    if pairing:
+        pairing.result = 'draw' if draw else winner_id
+    update_buchholz(gains, opponents, (p1, p2) if pairing else None)
+    return winner_id, draw
+
+def advance_swiss(swiss_round):
+    """Advance the Swiss stage once every pairing of ``swiss_round`` is in.
+
+    Rounds 1-3 lead to the next pairing; after round 4 the final standings
+    are split into leagues of four. Returns the resulting round number.
+    """
+    pending = SwissPairing.query.filter_by(round_no=swiss_round, winner_id=None, draw=False)
+    if pending.first():
+        return swiss_round
+    close_rating_period()
+    swiss_scores, swiss_diff, swiss_wins, swiss_buchholz = load_swiss_standings()
+    if swiss_round >= 4:
+        swiss_round += 1
+        by_id = {p.id: p for p in Amiibo.query.all()}
+        players = [
+            by_id[pid]
+            for pid in standings.rank(list(by_id), swiss_scores, swiss_diff, swiss_wins, swiss_buchholz)
+        ]
+        total = len(players)
+        num_groups = (total + 3) // 4
+        groups = {chr(ord('A') + i): [] for i in range(num_groups)}
+        for idx, p in enumerate(players):
+            p.league = chr(ord('A') + min(idx // 4, num_groups - 1))
+            groups[p.league].append(p.id)
+        start_leagues(groups)
+        publish('leagues', groups)
+    else:
+        swiss_round += 1
+        players = sorted(Amiibo.query.all(), key=lambda a: (-swiss_scores.get(a.id, 0), a.current_elo))
+        swiss_previous_matches = load_swiss_history()[0]
+        pairs = generate_swiss_pairs(players, swiss_previous_matches)
+        for pp1, pp2, _ in pairs:
+            db.session.add(SwissPairing(round_no=swiss_round, player1_id=pp1, player2_id=pp2))
+        publish('swiss_round', {'round': swiss_round, 'pairings': [[pp1, pp2] for pp1, pp2, _ in pairs]})
+    set_state('swiss_round', swiss_round)
+    return swiss_round
+
+
+@app.route('/report_swiss_result', methods=['POST'])
+@serialized_write
+def report_swiss_result():
+    run_action('swiss_result', result_payload(request.form))
+    save_state()
     return redirect('/swiss')
 
 
 @app.route('/league', methods=['GET'])
+@cached_page
 def league():
+    league_matches, league_scores, league_diff, league_wins, league_sb, _ = load_league_state()
+    load_amiibos(
+        [pid for scores in league_scores.values() for pid in scores]
+        + [pid for rounds in league_matches.values() for ms in rounds.values() for m in ms for pid in m]
+    )
     displays = []
     for lg in sorted(league_scores.keys()):
         scores = league_scores[lg]
         diffs = league_diff.get(lg, {})
         wins = league_wins.get(lg, {})
-        sb = {}
-        for pid in scores:
-            sb[pid] = sum(scores.get(op, 0) * pts for op, pts in league_results.get(pid, []))
+        sb = league_sb.get(lg, {})
         players = [
             (
-                Amiibo.query.get(pid),
+                get_amiibo(pid),
                 scores[pid],
                 diffs.get(pid, 0),
                 wins.get(pid, 0),
-                sb[pid],
+                sb.get(pid, 0),
             )
-            for pid in scores
+            for pid in standings.rank(scores, scores, diffs, wins, sb)
         ]
-        players.sort(key=lambda x: (x[1], x[2], x[3], x[4]), reverse=True)
-        def resolve(w):
-            if w == 'draw':
-                return 'Draw'
-            return Amiibo.query.get(w) if w else None
         rounds = []
         lg_matches = league_matches.get(lg, {})
         for rnd in sorted(lg_matches.keys()):
             mlist = [
-                (Amiibo.query.get(p1), Amiibo.query.get(p2), resolve(w))
+                (get_amiibo(p1), get_amiibo(p2), resolve_winner(w))
                 for p1, p2, w in lg_matches[rnd]
             ]
             rounds.append((rnd, mlist))
@@ -589,69 +1349,88 @@ def league():
     return render_template('league.html', leagues=displays)
 
 
-@app.route('/report_league_result', methods=['POST'])
-def report_league_result():
-    league = request.form['league']
-    p1 = int(request.form['player1'])
-    p2 = int(request.form['player2'])
-    score1 = int(request.form['score1'])
-    score2 = int(request.form['score2'])
-    round_no = int(request.form['round'])
-    winner_id, draw = record_match(p1, p2, score1, score2, round_no)
+def apply_league_result(league, round_no, p1, p2, score1, score2, strict=False):
+    """Record a league result and update both standings and the fixture.
+
+    With ``strict`` the fixture must exist and still be open, otherwise
+    ValueError is raised before anything is written.
+    """
+    fixture = LeagueFixture.query.filter_by(
+        league=league, round_no=round_no, player1_id=p1, player2_id=p2
+    ).first()
+    if strict and (fixture is None or fixture.result is not None):
+        raise ValueError(f'no open fixture {p1} vs {p2} in league {league} round {round_no}')
+    earlier = league_results_against([p1, p2])
+    winner_id, draw = record_match(
+        p1, p2, score1, score2, round_no, {'type': 'league', 'league': league}
+    )
+    rows = {
+        s.amiibo_id: s
+        for s in LeagueStanding.query.filter(LeagueStanding.amiibo_id.in_([p1, p2]))
+    }
     if draw:
-        league_scores[league][p1] += 0.5
-        league_scores[league][p2] += 0.5
+        gains = {p1: 0.5, p2: 0.5}
     else:
-        league_scores[league][winner_id] += 1
-        league_wins[league][winner_id] += 1
-    league_diff[league][p1] += score1 - score2
-    league_diff[league][p2] += score2 - score1
-    league_results.setdefault(p1, []).append((p2, 1 if winner_id == p1 else 0.5 if draw else 0))
-    league_results.setdefault(p2, []).append((p1, 1 if winner_id == p2 else 0.5 if draw else 0))
-    matches = league_matches.get(league, {}).get(round_no, [])
-    for idx, m in enumerate(matches):
-        if (m[0], m[1]) == (p1, p2):
-            matches[idx] = (p1, p2, 'draw' if draw else winner_id)
-            break
-    league_matches.setdefault(league, {})[round_no] = matches
-    # match stored via record_match
-    save_all_state()
+        gains = {p1: 1, p2: 0} if winner_id == p1 else {p1: 0, p2: 1}
+        rows[winner_id].wins += 1
+    rows[p1].score += gains[p1]
+    rows[p2].score += gains[p2]
+    rows[p1].diff += score1 - score2
+    rows[p2].diff += score2 - score1
+    if fixture:
+        fixture.result = 'draw' if draw else winner_id
+    new_result = (p1, p2, gains[p1], gains[p2]) if fixture else None
+    scores = {pid: rows[pid].score for pid in gains}
+    deltas = standings.sonneborn_berger_update(gains, earlier, scores, new_result)
+    for s in LeagueStanding.query.filter(LeagueStanding.amiibo_id.in_(deltas)):
+        s.sonneborn_berger += deltas[s.amiibo_id]
+    # a league matchday is a rating period
+    open_fixtures = LeagueFixture.query.filter_by(round_no=round_no, winner_id=None, draw=False)
+    if not open_fixtures.first():
+        close_rating_period()
+    return winner_id, draw
+
+
+@app.route('/report_league_result', methods=['POST'])
+@serialized_write
+def report_league_result():
+    payload = result_payload(request.form)
+    payload.update(league=request.form['league'], round=int(request.form['round']))
+    run_action('league_result', payload)
+    save_state()
     return redirect('/league')
 
+def award_title(champ, kind, key):
+    """Record a ``'league'`` or ``'ko'`` title won in the running season."""
+    season_id = (db.session.scalar(select(func.max(Season.id))) or 0) + 1
+    db.session.add(Title(amiibo_id=champ.id, kind=kind, key=key, season_id=season_id))
+    if kind == 'ko':
+        champ.ko_titles = (champ.ko_titles + ',' if champ.ko_titles else '') + key
+        refresh_titles([champ.id])
+    else:
+        champ.league_titles = (champ.league_titles + ',' if champ.league_titles else '') + key
+
 def promote_and_relegate():
+    league_matches, league_scores, league_diff, league_wins, league_sb, _ = load_league_state()
     players = Amiibo.query.filter_by(waiting=False).all()
+    by_id = {p.id: p for p in players}
     groups = sorted(set(p.league for p in players))
     rankings = {}
-    for g in groups:
-        scores = league_scores.get(g, {})
-        diffs = league_diff.get(g, {})
-        wins = league_wins.get(g, {})
-        sb = {}
-        for pid in scores:
-            sb[pid] = sum(scores.get(op, 0) * pts for op, pts in league_results.get(pid, []))
-        ordered = sorted(
-            scores.keys(),
-            key=lambda pid: (
-                scores[pid],
-                diffs.get(pid, 0),
-                wins.get(pid, 0),
-                sb[pid],
-            ),
-            reverse=True,
-        )
+    for group in groups:
+        scores = league_scores.get(group, {})
+        diffs = league_diff.get(group, {})
+        wins = league_wins.get(group, {})
+        ordered = standings.rank(scores, scores, diffs, wins, league_sb.get(group, {}))
         if ordered:
-            rankings[g] = list(ordered)
+            rankings[group] = list(ordered)
     # Award league titles to the top player in each group
-    for g, rank in rankings.items():
+    for group, rank in rankings.items():
         if rank:
-            champ = Amiibo.query.get(rank[0])
-            champ.league_titles = (
-                (champ.league_titles + ',' if champ.league_titles else '') + g
-            )
+            award_title(by_id[rank[0]], 'league', group)
     promotions = {}
     relegations = {}
-    for i, g in enumerate(groups):
-        rank = rankings.get(g)
+    for i, group in enumerate(groups):
+        rank = rankings.get(group)
         if not rank:
             continue
         if i > 0 and rank:
@@ -659,17 +1438,30 @@ def promote_and_relegate():
         if i < len(groups) - 1 and rank:
             relegations[rank[-1]] = groups[i+1]
     for pid, lg in promotions.items():
-        Amiibo.query.get(pid).league = lg
+        by_id[pid].league = lg
     for pid, lg in relegations.items():
-        Amiibo.query.get(pid).league = lg
-    db.session.commit()
+        by_id[pid].league = lg
+
+def start_leagues(groups):
+    """Replace league standings and fixtures with a fresh round-robin.
+
+    ``groups`` maps each league to its player IDs in seeding order; all
+    rows are written with one bulk insert per table.
+    """
+    LeagueFixture.query.delete()
+    LeagueStanding.query.delete()
+    standings_rows = [
+        {'league': league, 'amiibo_id': pid, 'score': 0, 'diff': 0, 'wins': 0, 'sonneborn_berger': 0}
+        for league, ids in groups.items()
+        for pid in ids
+    ]
+    if standings_rows:
+        db.session.execute(insert(LeagueStanding), standings_rows)
+    fixtures = group_fixtures(groups, app.config['LEAGUE_DOUBLE_ROUND_ROBIN'])
+    if fixtures:
+        db.session.execute(insert(LeagueFixture), fixtures)
 
 def setup_league_matches():
-    league_matches.clear()
-    league_scores.clear()
-    league_diff.clear()
-    league_wins.clear()
-    league_results.clear()
     players = Amiibo.query.all()
     groups = sorted(set(p.league for p in players if p.league))
     if not groups:
@@ -685,97 +1477,103 @@ def setup_league_matches():
         w.league = last_group
         w.waiting = False
         size += 1
-    db.session.commit()
-    players = Amiibo.query.all()
-    groups = sorted(set(p.league for p in players if p.league))
-    for g in groups:
-        pls = [p for p in players if p.league == g]
-        league_scores[g] = {p.id: 0 for p in pls}
-        league_diff[g] = {p.id: 0 for p in pls}
-        league_wins[g] = {p.id: 0 for p in pls}
-        ids = [p.id for p in pls]
-        rounds = {}
-        if len(ids) % 2 == 1:
-            ids.append(None)
-        n = len(ids)
-        for r in range(n - 1):
-            pairings = []
-            for i in range(n // 2):
-                p1 = ids[i]
-                p2 = ids[n - 1 - i]
-                if p1 is not None and p2 is not None:
-                    pairings.append((p1, p2, None))
-            rounds[r + 1] = pairings
-            ids = [ids[0]] + [ids[-1]] + ids[1:-1]
-        league_matches[g] = rounds
-    save_all_state()
+    members = {}
+    for p in players:
+        if p.league:
+            members.setdefault(p.league, []).append(p.id)
+    start_leagues(dict(sorted(members.items())))
 
 def setup_knockouts():
-    knockout_brackets.clear()
-    knockout_remaining.clear()
-    knockout_history.clear()
-    players = Amiibo.query.filter_by(waiting=False).all()
+    """Start a bracket for every two leagues, seeded by Elo.
+
+    Brackets of any size are filled up with byes for the top seeds; a
+    league left without a partner gets a bracket of its own.
+    """
+    KnockoutMatch.query.delete()
+    KnockoutBracket.query.delete()
+    set_state('knockout_rated_round', 0)
+    players = (
+        Amiibo.query.filter(Amiibo.waiting.is_(False), Amiibo.league != '')
+        .order_by(Amiibo.current_elo.desc(), Amiibo.id)
+        .all()
+    )
     players_by_group = {}
     for p in players:
         players_by_group.setdefault(p.league, []).append(p)
-    groups = sorted([g for g, ps in players_by_group.items() if len(ps) == 4])
-    i = 0
-    while i < len(groups):
-        g1 = groups[i]
-        g2 = groups[i + 1] if i + 1 < len(groups) else None
-        if g2:
-            key = g1 + g2
-            contestants = players_by_group[g1] + players_by_group[g2]
-            i += 2
-        else:
-            key = g1
-            contestants = players_by_group[g1]
-            i += 1
-        random.shuffle(contestants)
-        knockout_remaining[key] = [p.id for p in contestants]
-        pairs = []
-        for j in range(0, len(contestants), 2):
-            if j+1 < len(contestants):
-                pairs.append((contestants[j].id, contestants[j+1].id, None))
-        knockout_brackets[key] = pairs
-        knockout_history[key] = [list(pairs)]
-    save_all_state()
+    groups = sorted(players_by_group)
+    for i in range(0, len(groups), 2):
+        key = ''.join(groups[i:i + 2])
+        contestants = [p.id for p in players if p.league in groups[i:i + 2]]
+        if len(contestants) < 2:
+            continue
+        tree = bracket.build(contestants)
+        db.session.add(KnockoutBracket(key=key, round_no=1, tree=json.dumps(tree)))
+        schedule_knockout_round(key, tree, 1)
+
+def schedule_knockout_round(key, tree, round_no):
+    """Add the games of a bracket round and return their pairings.
+
+    Players with a bye are already placed in their node and need no game.
+    """
+    pairings = []
+    for slot, i in enumerate(bracket.round_nodes(tree, round_no)):
+        p1, p2 = bracket.game(tree, i)
+        if tree[i] is None:
+            db.session.add(KnockoutMatch(
+                bracket=key, round_no=round_no, slot=slot, player1_id=p1, player2_id=p2,
+            ))
+            pairings.append([p1, p2])
+    return pairings
 
 def advance_knockout(key):
-    winners = []
-    for m in knockout_brackets[key]:
-        if m[2] == 'draw':
-            return
-        if m[2]:
-            winners.append(m[2])
-    if len(winners) * 2 != len(knockout_brackets[key]) * 2:
+    """Start the next round of a bracket, or crown its champion, once a round is done."""
+    row = db.session.get(KnockoutBracket, key)
+    if row is None or row.champion_id:
         return
-    if len(winners) == 1:
-        champ = Amiibo.query.get(winners[0])
-        champ.ko_titles = (champ.ko_titles + ',' if champ.ko_titles else '') + key
-        db.session.commit()
-        knockout_brackets[key] = []
-        knockout_remaining[key] = winners
-        knockout_history.setdefault(key, []).append([])
+    tree = json.loads(row.tree)
+    if not bracket.round_done(tree, row.round_no):
+        return
+    champ = bracket.champion(tree)
+    if champ is not None:
+        award_title(get_amiibo(champ), 'ko', key)
+        row.champion_id = champ
+        publish('knockout_round', {'bracket': key, 'champion_id': champ})
     else:
-        random.shuffle(winners)
-        pairs = []
-        for i in range(0, len(winners), 2):
-            if i+1 < len(winners):
-                pairs.append((winners[i], winners[i+1], None))
-        knockout_brackets[key] = pairs
-        knockout_remaining[key] = winners
-        knockout_history.setdefault(key, []).append(list(pairs))
-    save_all_state()
+        row.round_no += 1
+        pairings = schedule_knockout_round(key, tree, row.round_no)
+        publish('knockout_round', {'bracket': key, 'round': row.round_no, 'pairings': pairings})
 
 def check_knockouts_done():
-    for k in knockout_brackets:
-        if knockout_brackets[k]:
-            return False
-    return True
+    return KnockoutMatch.query.filter_by(winner_id=None, draw=False).first() is None
+
+def knockout_rounds_finished():
+    """Return the last round every bracket has finished, or None once all have champions."""
+    finished = []
+    for row in KnockoutBracket.query.filter_by(champion_id=None):
+        tree = json.loads(row.tree)
+        finished.append(row.round_no if bracket.round_done(tree, row.round_no) else row.round_no - 1)
+    return min(finished, default=None)
+
+def advance_knockouts(keys):
+    """Advance the given brackets and start the next season once all are done.
+
+    A knockout round is one rating period however many brackets play it,
+    so the period closes when the last bracket finishes that round.
+    """
+    for key in keys:
+        advance_knockout(key)
+    finished = knockout_rounds_finished()
+    if finished is None or finished > get_state('knockout_rated_round', 0):
+        close_rating_period()
+        set_state('knockout_rated_round', finished or 0)
+    if check_knockouts_done():
+        archive_current_season()
+        setup_league_matches()
 
 def archive_current_season():
     """Store league standings and knockout history for the completed season."""
+    league_matches, league_scores, league_diff, league_wins, league_sb, league_results = load_league_state()
+    knockout_history, champions = load_knockout_state()
     league_serial = {
         'scores': league_scores,
         'diff': league_diff,
@@ -788,136 +1586,499 @@ def archive_current_season():
     }
     knockout_serial = {
         'history': {k: [[list(p) for p in rnd] for rnd in rounds] for k, rounds in knockout_history.items()},
-        'winners': knockout_remaining,
+        'winners': {k: [c] if c else [] for k, c in champions.items()},
     }
     season = Season(
         league_data=json.dumps(league_serial),
         knockout_data=json.dumps(knockout_serial),
     )
     db.session.add(season)
-    db.session.commit()
+    db.session.flush()
+    store_season_results(season.id, league_scores, league_diff, league_wins, league_sb, champions)
+    # the live feed only needs recent events for reconnecting clients
+    newest = db.session.scalar(select(func.max(LiveEvent.id))) or 0
+    LiveEvent.query.filter(LiveEvent.id <= newest - LIVE_KEEP).delete()
+    # a new season starts from a snapshot, so undo and replay stay short
+    g.snapshot_due = True
 
 @app.route('/finish_league', methods=['POST'])
+@serialized_write
 def finish_league():
-    promote_and_relegate()
-    setup_knockouts()
+    run_action('finish_league', {})
+    save_state()
     return redirect('/knockout')
 
 @app.route('/knockout', methods=['GET'])
+@cached_page
 def knockout():
+    """Draw every bracket from its tree, up to its current round."""
     displays = {}
+    rows = KnockoutBracket.query.order_by(KnockoutBracket.key).all()
+    trees = {row.key: json.loads(row.tree) for row in rows}
+    load_amiibos([pid for tree in trees.values() for pid in tree if pid is not None])
 
-    def resolve(w):
-        if w == 'draw':
-            return 'Draw'
-        return Amiibo.query.get(w) if w else None
-
-    for key, rounds in knockout_history.items():
-        winner = None
-        if not knockout_brackets.get(key) and knockout_remaining.get(key):
-            winner = Amiibo.query.get(knockout_remaining[key][0])
-
+    for row in rows:
+        tree = trees[row.key]
+        champ = bracket.champion(tree)
         rounds_disp = []
-        for matches in rounds:
+        for round_no in range(1, row.round_no + 1):
+            nodes = bracket.round_nodes(tree, round_no)
             pair_list = []
-            for i in range(0, len(matches), 2):
+            # sibling games feed the same game of the next round
+            for first in range(nodes.start, nodes.stop, 2):
                 match_items = []
-                pair_highlight = False
-                for j in range(2):
-                    if i + j < len(matches):
-                        p1, p2, w = matches[i + j]
-                        p1_obj = Amiibo.query.get(p1)
-                        p2_obj = Amiibo.query.get(p2)
-                        w_obj = resolve(w)
-                        highlight = bool(winner and getattr(w_obj, 'id', None) == winner.id)
-                        match_items.append((p1_obj, p2_obj, w_obj, highlight))
-                        pair_highlight = pair_highlight or highlight
-                    else:
+                for i in (first, first + 1):
+                    if i not in nodes:
                         match_items.append(None)
-                pair_list.append({'matches': match_items, 'highlight': pair_highlight})
+                        continue
+                    p1, p2 = bracket.game(tree, i)
+                    highlight = champ is not None and tree[i] == champ
+                    match_items.append((
+                        get_amiibo(p1), get_amiibo(p2), get_amiibo(tree[i]), highlight, i - nodes.start,
+                    ))
+                pair_list.append({
+                    'matches': match_items,
+                    'highlight': any(m and m[3] for m in match_items),
+                })
             rounds_disp.append(pair_list)
 
-        displays[key] = {'rounds': rounds_disp}
+        displays[row.key] = {'rounds': rounds_disp}
 
     return render_template('knockout.html', brackets=displays)
 
+def apply_knockout_result(key, p1, p2, score1, score2, strict=False, slot=None):
+    """Record a knockout result in its bracket slot; a draw adds a rematch.
+
+    The winner is placed in the bracket tree. ``slot`` (sent by the bracket
+    page) narrows the lookup to one game. With ``strict`` the game must be
+    open in the bracket's current round, otherwise ValueError is raised
+    before anything is written.
+    """
+    row = db.session.get(KnockoutBracket, key)
+    match = None
+    if row:
+        open_games = KnockoutMatch.query.filter_by(
+            bracket=key, round_no=row.round_no,
+            player1_id=p1, player2_id=p2, winner_id=None, draw=False,
+        )
+        if slot is not None:
+            open_games = open_games.filter_by(slot=slot)
+        match = open_games.first()
+    if strict and match is None:
+        raise ValueError(f'no open knockout game {p1} vs {p2} in bracket {key}')
+    winner_id, draw = record_match(p1, p2, score1, score2, context={'type': 'knockout', 'bracket': key})
+    if match:
+        match.result = 'draw' if draw else winner_id
+        if draw:
+            # keep the draw in history but schedule a rematch in the same slot
+            db.session.add(KnockoutMatch(
+                bracket=key, round_no=match.round_no, slot=match.slot,
+                player1_id=p1, player2_id=p2,
+            ))
+        else:
+            tree = json.loads(row.tree)
+            bracket.place(tree, bracket.node(tree, match.round_no, match.slot), winner_id)
+            row.tree = json.dumps(tree)
+    db.session.flush()
+    return winner_id, draw
+
+
 @app.route('/report_knockout_result', methods=['POST'])
+@serialized_write
 def report_knockout_result():
-    key = request.form['bracket']
-    p1 = int(request.form['player1'])
-    p2 = int(request.form['player2'])
-    score1 = int(request.form['score1'])
-    score2 = int(request.form['score2'])
-    winner_id, draw = record_match(p1, p2, score1, score2)
-    matches = knockout_brackets.get(key, [])
-    for idx, m in enumerate(matches):
-        if (m[0], m[1]) == (p1, p2):
-            if draw:
-                # keep the draw in history but schedule a rematch
-                matches[idx] = (p1, p2, None)
-            else:
-                matches[idx] = (p1, p2, winner_id)
-            break
-    knockout_brackets[key] = matches
-    # mirror result in history
-    round_idx = len(knockout_history.get(key, [])) - 1
-    if round_idx >= 0:
-        hist_round = knockout_history.setdefault(key, [])[round_idx]
-        for idx, m in enumerate(hist_round):
-            if (m[0], m[1]) == (p1, p2):
-                hist_round[idx] = (p1, p2, 'draw' if draw else winner_id)
-                if draw:
-                    # add a new entry for the rematch immediately after
-                    hist_round.insert(idx + 1, (p1, p2, None))
-                break
-    db.session.commit()
-    advance_knockout(key)
-    if check_knockouts_done():
-        archive_current_season()
-        setup_league_matches()
-    save_all_state()
+    payload = result_payload(request.form)
+    payload.update(bracket=request.form['bracket'], slot=request.form.get('slot', type=int))
+    run_action('knockout_result', payload)
+    save_state()
     return redirect('/knockout')
 
 
+@app.route('/report_results', methods=['POST'])
+@serialized_write
+def report_results():
+    """Apply a JSON batch of results in order inside one transaction.
+
+    The body is ``{"results": [...]}`` (or a bare list) of objects with
+    ``type`` (``swiss``, ``league``, ``knockout`` or ``match``), ``player1``,
+    ``player2``, ``score1``, ``score2`` plus ``league``/``round`` for league
+    and ``bracket`` for knockout results. Any invalid entry rejects the
+    whole batch.
+    """
+    data = request.get_json(silent=True)
+    items = data.get('results') if isinstance(data, dict) else data
+    if not isinstance(items, list):
+        return jsonify(error='expected a list of results'), 400
+    try:
+        applied = run_action('results', {'results': items})
+    except InvalidResult as exc:
+        db.session.rollback()
+        return jsonify(error=str(exc), index=exc.index), 400
+    save_state()
+    return jsonify(applied=applied)
+
+def apply_results(items):
+    """Apply a batch of results and return the outcome of each entry.
+
+    Elo is updated result by result; Swiss and knockout advancement runs
+    once after the whole batch. Raises InvalidResult for the first entry
+    that cannot be applied.
+    """
+    swiss_round = get_state('swiss_round', 0)
+    swiss_touched = False
+    brackets = []
+    applied = []
+    for index, item in enumerate(items):
+        try:
+            kind = item.get('type', 'match')
+            p1 = int(item['player1'])
+            p2 = int(item['player2'])
+            score1 = int(item['score1'])
+            score2 = int(item['score2'])
+            if kind == 'swiss':
+                winner_id, draw = apply_swiss_result(swiss_round, p1, p2, score1, score2, strict=True)
+                swiss_touched = True
+            elif kind == 'league':
+                winner_id, draw = apply_league_result(
+                    item['league'], int(item['round']), p1, p2, score1, score2, strict=True
+                )
+            elif kind == 'knockout':
+                key = item['bracket']
+                winner_id, draw = apply_knockout_result(key, p1, p2, score1, score2, strict=True)
+                if key not in brackets:
+                    brackets.append(key)
+            elif kind == 'match':
+                winner_id, draw = record_match(p1, p2, score1, score2)
+            else:
+                raise ValueError(f'unknown result type {kind!r}')
+        except (AttributeError, KeyError, TypeError, ValueError) as exc:
+            raise InvalidResult(index, str(exc)) from exc
+        applied.append({'index': index, 'winner_id': winner_id, 'draw': draw})
+    if swiss_touched:
+        advance_swiss(swiss_round)
+    if brackets:
+        advance_knockouts(brackets)
+    return applied
+
+
+def result_payload(form):
+    """The players and scores of a submitted result form."""
+    return {key: int(form[key]) for key in ('player1', 'player2', 'score1', 'score2')}
+
+def log_action(kind, payload):
+    """Append an action to the log in the request's transaction."""
+    action = Action(kind=kind, payload=json.dumps(payload), created_at=time.time())
+    db.session.add(action)
+    db.session.flush()
+    g.action_id = action.id
+
+def apply_action(kind, payload):
+    """Carry out a logged action; write endpoints and replay share this.
+
+    Everything an action does is derived from its payload and the stored
+    state, so replaying the log after a snapshot reproduces the tables.
+    A season rollover is part of the knockout result that completes it.
+    """
+    if kind == 'add_amiibos':
+        return import_amiibos(payload['names'])
+    if kind == 'profile_pic':
+        db.session.get(Amiibo, payload['amiibo_id']).profile_pic = payload['profile_pic']
+    elif kind == 'match':
+        record_match(payload['player1'], payload['player2'], payload['score1'], payload['score2'])
+    elif kind == 'start_swiss':
+        begin_swiss()
+    elif kind == 'swiss_result':
+        swiss_round = get_state('swiss_round', 0)
+        apply_swiss_result(
+            swiss_round, payload['player1'], payload['player2'], payload['score1'], payload['score2']
+        )
+        advance_swiss(swiss_round)
+    elif kind == 'league_result':
+        apply_league_result(
+            payload['league'], payload['round'],
+            payload['player1'], payload['player2'], payload['score1'], payload['score2'],
+        )
+    elif kind == 'finish_league':
+        promote_and_relegate()
+        setup_knockouts()
+    elif kind == 'knockout_result':
+        apply_knockout_result(
+            payload['bracket'], payload['player1'], payload['player2'],
+            payload['score1'], payload['score2'], slot=payload['slot'],
+        )
+        advance_knockouts([payload['bracket']])
+    elif kind == 'results':
+        return apply_results(payload['results'])
+    elif kind in ADMIN_ACTIONS:
+        raise ValueError(f'{kind} cannot be replayed; replay from the snapshot taken after it')
+    else:
+        raise ValueError(f'unknown action {kind!r}')
+
+def run_action(kind, payload):
+    """Log an action and carry it out; the caller saves the state."""
+    log_action(kind, payload)
+    return apply_action(kind, payload)
+
+def replay_actions(snapshot, actions):
+    """Restore ``snapshot`` and apply ``actions`` on top of it, in order."""
+    g.pop('state_writes', None)
+    restore_snapshot(snapshot)
+    g.pop('amiibo_cache', None)
+    g.replaying = True
+    try:
+        for action in actions:
+            apply_action(action.kind, json.loads(action.payload))
+    finally:
+        g.pop('replaying', None)
+
+@app.cli.command('undo-last-result')
+def undo_last_result():
+    """Take back the newest result by replaying the log without it."""
+    last = Action.query.filter(Action.kind.in_(RESULT_ACTIONS)).order_by(Action.id.desc()).first()
+    if last is None:
+        raise click.ClickException('no result to undo')
+    snapshot = latest_snapshot(before=last.id)
+    if snapshot is None:
+        raise click.ClickException(f'action {last.id} is older than the oldest snapshot')
+    tail = [action for action in actions_after(snapshot.action_id) if action.id != last.id]
+    admin = next((action for action in tail if action.kind in ADMIN_ACTIONS), None)
+    if admin is not None:
+        # replaying would silently drop what the command changed
+        raise click.ClickException(
+            f'{admin.kind.replace("_", "-")} ran after action {last.id}; undo is not possible past it'
+        )
+    undone = f'{last.kind} {last.payload}'
+    g.state_version = get_state('version', 0)
+    db.session.execute(delete(Snapshot).where(Snapshot.action_id >= last.id))
+    db.session.delete(last)
+    replay_actions(snapshot, tail)
+    save_state()
+    print(f'Undid {undone}, replayed {len(tail)} actions.')
+
+@app.cli.command('replay-log')
+def replay_log():
+    """Rebuild the tournament tables from the latest snapshot and the log after it."""
+    snapshot = latest_snapshot()
+    if snapshot is None:
+        raise click.ClickException('no snapshot to replay from')
+    tail = actions_after(snapshot.action_id)
+    g.state_version = get_state('version', 0)
+    replay_actions(snapshot, tail)
+    save_state()
+    print(f'Replayed {len(tail)} actions after action {snapshot.action_id}.')
+
+
 @app.route('/seasons', methods=['GET'])
+@cached_page
 def seasons_view():
-    """Display archived results of past seasons."""
+    """Display archived results of past seasons, newest first."""
+    total = db.session.scalar(select(func.count(Season.id)))
+    pages = max((total + SEASONS_PER_PAGE - 1) // SEASONS_PER_PAGE, 1)
+    page = min(max(request.args.get('page', 1, type=int), 1), pages)
+    ids = db.session.scalars(
+        select(Season.id)
+        .order_by(Season.id.desc())
+        .limit(SEASONS_PER_PAGE)
+        .offset((page - 1) * SEASONS_PER_PAGE)
+    ).all()
+    winners, champions = load_season_winners(ids)
+    items = {sid: {'id': sid, 'leagues': [], 'brackets': {}} for sid in ids}
+    for w in winners:
+        items[w.season_id]['leagues'].append((w.league, get_amiibo(w.amiibo_id)))
+    for c in champions:
+        items[c.season_id]['brackets'][c.bracket] = get_amiibo(c.amiibo_id) if c.amiibo_id else None
+
+    return render_template(
+        'seasons.html',
+        seasons=list(items.values()),
+        page=page,
+        pages=pages,
+    )
+
+def api_result(result):
+    """Split a stored pairing result into ``(winner_id, draw)``."""
+    if result == 'draw':
+        return None, True
+    return result, False
+
+def requested_fields(allowed, arg='fields'):
+    """Return the comma separated ``?fields=`` of the request, or None for all.
+
+    Names outside the endpoint's ``allowed`` fields are rejected with a 400,
+    whether or not there is anything to list.
+    """
+    fields = request.args.get(arg)
+    if not fields:
+        return None
+    fields = [f.strip() for f in fields.split(',') if f.strip()]
+    unknown = [f for f in fields if f not in allowed]
+    if unknown:
+        abort(app.make_response((jsonify(error=f'unknown fields: {", ".join(unknown)}'), 400)))
+    return fields
+
+def select_fields(items, fields):
+    """Reduce ``items`` to ``fields``; None keeps every field."""
+    if fields is None:
+        return items
+    return [{f: item[f] for f in fields} for item in items]
+
+def api_fields(items, allowed, arg='fields'):
+    """Reduce ``items`` to the requested fields of ``allowed``."""
+    return select_fields(items, requested_fields(allowed, arg))
+
+def api_limit():
+    """Return the requested page size, clamped to ``API_MAX_LIMIT``."""
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    return min(max(limit, 1), API_MAX_LIMIT)
+
+@app.route('/api/v1/amiibos', methods=['GET'])
+@cached_page
+def api_amiibos():
+    """All Amiibos by rating with record and title; ``?last`` limits the record.
+
+    ``?title`` and ``?sort`` work as on the leaderboard.
+    """
+    last = request.args.get('last', type=int)
+    amiibos = leaderboard_amiibos()
+    remember_amiibos(amiibos)
+    records = match_records(last)
     items = []
-    for s in Season.query.order_by(Season.id.desc()).all():
-        league = json.loads(s.league_data)
-        knockout = json.loads(s.knockout_data)
-        leagues_disp = []
-        scores = league.get('scores', {})
-        diffs = league.get('diff', {})
-        wins = league.get('wins', {})
-        results = {
-            int(pid): [(int(o), r) for o, r in lst]
-            for pid, lst in league.get('results', {}).items()
-        }
-        for lg in sorted(scores.keys()):
-            sc = {int(pid): val for pid, val in scores[lg].items()}
-            df = {int(pid): diffs.get(lg, {}).get(pid, 0) for pid in sc}
-            wn = {int(pid): wins.get(lg, {}).get(pid, 0) for pid in sc}
-            sb = {}
-            for pid in sc:
-                sb[pid] = sum(sc.get(op, 0) * pts for op, pts in results.get(pid, []))
-            players = [
-                (Amiibo.query.get(pid), sc[pid], df[pid], wn[pid], sb[pid])
-                for pid in sc
-            ]
-            players.sort(key=lambda x: (x[1], x[2], x[3], x[4]), reverse=True)
-            winner = players[0][0] if players else None
-            leagues_disp.append((lg, winner))
+    for a in amiibos:
+        wins, draws, losses = records.get(a.id, (0, 0, 0))
+        items.append({
+            'id': a.id,
+            'name': a.name,
+            'current_elo': a.current_elo,
+            'peak_elo': a.peak_elo,
+            'title': a.title,
+            'league': a.league,
+            'ko_titles': a.ko_titles,
+            'league_titles': a.league_titles,
+            'wins': wins,
+            'draws': draws,
+            'losses': losses,
+            'win_pct': win_percentage(wins, draws, losses),
+            'profile_pic': a.profile_pic,
+        })
+    return {'items': api_fields(items, AMIIBO_FIELDS)}
 
-        brackets = {}
-        winners = knockout.get('winners', {})
-        for key, w in winners.items():
-            win = Amiibo.query.get(w[0]) if w else None
-            brackets[key] = win
+@app.route('/api/v1/matches', methods=['GET'])
+@cached_page
+def api_matches():
+    """Match history, newest first, paged with ``?before=<match id>``.
+
+    ``?amiibo=<id>`` limits the history to one Amiibo. The response's
+    ``next`` is the cursor for the following page, or null on the last.
+    """
+    limit = api_limit()
+    query = select(Match).order_by(Match.id.desc()).limit(limit + 1)
+    before = request.args.get('before', type=int)
+    if before is not None:
+        query = query.where(Match.id < before)
+    amiibo_id = request.args.get('amiibo', type=int)
+    if amiibo_id is not None:
+        query = query.where((Match.player1_id == amiibo_id) | (Match.player2_id == amiibo_id))
+    matches = db.session.scalars(query).all()
+    more = len(matches) > limit
+    matches = matches[:limit]
+    load_amiibos([m.player1_id for m in matches] + [m.player2_id for m in matches])
+    items = [
+        {
+            'id': m.id,
+            'round': m.round_no,
+            'player1_id': m.player1_id,
+            'player1': get_amiibo(m.player1_id).name,
+            'player2_id': m.player2_id,
+            'player2': get_amiibo(m.player2_id).name,
+            'score1': m.score1,
+            'score2': m.score2,
+            'winner_id': m.winner_id,
+            'draw': bool(m.draw),
+        }
+        for m in matches
+    ]
+    return {'items': api_fields(items, MATCH_FIELDS), 'next': matches[-1].id if more else None}
 
-        items.append({'id': s.id, 'leagues': leagues_disp, 'brackets': brackets})
+@app.route('/api/v1/league', methods=['GET'])
+@cached_page
+def api_league():
+    """Standings and fixtures of the current leagues.
 
-    return render_template('seasons.html', seasons=items)
+    ``?fields=`` selects standings columns and ``?fixture_fields=`` fixture ones.
+    """
+    fields = requested_fields(STANDING_FIELDS)
+    fixture_fields = requested_fields(FIXTURE_FIELDS, 'fixture_fields')
+    league_matches, league_scores, league_diff, league_wins, league_sb, _ = load_league_state()
+    load_amiibos([pid for scores in league_scores.values() for pid in scores])
+    leagues = []
+    for lg in sorted(league_scores):
+        scores = league_scores[lg]
+        diffs = league_diff.get(lg, {})
+        wins = league_wins.get(lg, {})
+        sb = league_sb.get(lg, {})
+        table = [
+            {
+                'position': pos,
+                'amiibo_id': pid,
+                'name': get_amiibo(pid).name,
+                'score': scores[pid],
+                'diff': diffs.get(pid, 0),
+                'wins': wins.get(pid, 0),
+                'sonneborn_berger': sb.get(pid, 0),
+            }
+            for pos, pid in enumerate(standings.rank(scores, scores, diffs, wins, sb), 1)
+        ]
+        fixtures = []
+        for rnd, pairings in sorted(league_matches.get(lg, {}).items()):
+            for p1, p2, result in pairings:
+                winner_id, draw = api_result(result)
+                fixtures.append({
+                    'round': rnd, 'player1_id': p1, 'player2_id': p2,
+                    'winner_id': winner_id, 'draw': draw,
+                })
+        leagues.append({
+            'league': lg,
+            'standings': select_fields(table, fields),
+            'fixtures': select_fields(fixtures, fixture_fields),
+        })
+    return {'leagues': leagues}
+
+@app.route('/api/v1/knockout', methods=['GET'])
+@cached_page
+def api_knockout():
+    """Knockout brackets round by round with their champions; fields select game fields."""
+    fields = requested_fields(KNOCKOUT_GAME_FIELDS)
+    knockout_history, champions = load_knockout_state()
+    brackets = []
+    for key, rounds in knockout_history.items():
+        rounds_out = []
+        for matches in rounds:
+            pairs = []
+            for p1, p2, result in matches:
+                winner_id, draw = api_result(result)
+                pairs.append({'player1_id': p1, 'player2_id': p2, 'winner_id': winner_id, 'draw': draw})
+            rounds_out.append(select_fields(pairs, fields))
+        brackets.append({'bracket': key, 'champion_id': champions.get(key), 'rounds': rounds_out})
+    return {'brackets': brackets}
+
+@app.route('/api/v1/seasons', methods=['GET'])
+@cached_page
+def api_seasons():
+    """Archived seasons, newest first, paged with ``?before=<season id>``."""
+    limit = api_limit()
+    query = select(Season.id).order_by(Season.id.desc()).limit(limit + 1)
+    before = request.args.get('before', type=int)
+    if before is not None:
+        query = query.where(Season.id < before)
+    ids = db.session.scalars(query).all()
+    more = len(ids) > limit
+    ids = ids[:limit]
+    winners, champions = load_season_winners(ids)
+    items = {sid: {'id': sid, 'leagues': {}, 'brackets': {}} for sid in ids}
+    for w in winners:
+        items[w.season_id]['leagues'][w.league] = w.amiibo_id
+    for c in champions:
+        items[c.season_id]['brackets'][c.bracket] = c.amiibo_id
+    return {'items': api_fields(list(items.values()), SEASON_FIELDS), 'next': ids[-1] if more else None}
 
 if __name__ == '__main__':
     app.run(debug=True)
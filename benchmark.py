@@ -0,0 +1,621 @@
+"""Micro benchmarks against a synthetic database.
+
+Run ``python benchmark.py indexes`` to time per-player match lookups on a
+100k-match database without and with the ``Match`` player indexes.
+
+Run ``python benchmark.py tournament`` to play whole synthetic seasons
+through the Flask test client and write per-endpoint latency percentiles,
+SQL query counts and peak memory as JSON, for comparing commits.
+
+Run ``python benchmark.py swiss`` to compare the Swiss pairing engine with
+the former greedy first-fit pairing on a large simulated field.
+
+Run ``python benchmark.py ratings`` to time a full Elo replay of 100k
+matches with the rating engine against the former ORM replay loop.
+
+Run ``python benchmark.py glicko`` to time Glicko-2 rating periods against
+per-match Elo updates for thousands of players.
+
+Run ``python benchmark.py fixtures`` to time league setup for 500 players
+in 125 groups, the shared bulk round-robin against the former per-row loop.
+
+Run ``python benchmark.py startup`` to time app startup on a large database
+with every schema check repeated, as before migrations were versioned, and
+with the recorded schema version.
+
+Run ``python benchmark.py load`` to run reader and writer processes against
+one database, first with SQLite's and SQLAlchemy's defaults and then with
+the app's SQLite profile (WAL, pragmas and connection pool), and compare
+throughput and latency. All processes start timing together.
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+
+from flask import Flask
+from sqlalchemy import delete, insert, text
+
+from models import db, Amiibo, Match, LeagueFixture, LeagueStanding, State, match_records
+from models import Season, SeasonStanding
+from migrations import migrate
+from fixtures import group_fixtures
+from pairing import pair_round
+from ratings import EloBackend, Glicko2Backend, load_match_log, replay
+from ratings import INITIAL_DEVIATION, INITIAL_VOLATILITY
+
+
+def make_app(path):
+    """Return a bare Flask app bound to a fresh SQLite file at ``path``."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + path
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    db.init_app(app)
+    return app
+
+
+def fill_matches(players, matches, seed=1):
+    """Insert ``players`` Amiibos and ``matches`` random results."""
+    rng = random.Random(seed)
+    db.session.execute(insert(Amiibo), [{'name': f'P{i}'} for i in range(players)])
+    rows = []
+    for _ in range(matches):
+        p1, p2 = rng.sample(range(1, players + 1), 2)
+        s1, s2 = rng.randint(0, 3), rng.randint(0, 3)
+        rows.append({
+            'player1_id': p1, 'player2_id': p2,
+            'winner_id': None if s1 == s2 else (p1 if s1 > s2 else p2),
+            'draw': s1 == s2, 'score1': s1, 'score2': s2,
+        })
+    db.session.execute(insert(Match), rows)
+    db.session.commit()
+
+
+def timed(fn, repeat):
+    """Return the median wall time of ``fn`` in milliseconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    samples.sort()
+    return samples[len(samples) // 2]
+
+
+def bench_indexes(args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(path)
+    with app.app_context():
+        db.create_all()
+        fill_matches(args.players, args.matches)
+        player = args.players // 2
+
+        def profile_history():
+            Match.query.filter(
+                (Match.player1_id == player) | (Match.player2_id == player)
+            ).order_by(Match.id.desc()).all()
+
+        queries = {
+            'profile history': profile_history,
+            'record': lambda: match_records(None, [player]),
+            'record last 10': lambda: match_records(10, [player]),
+        }
+        plan_sql = (
+            'EXPLAIN QUERY PLAN SELECT * FROM match '
+            'WHERE player1_id = :p OR player2_id = :p ORDER BY id DESC'
+        )
+        for label, create in (('without indexes', False), ('with indexes', True)):
+            for index in Match.__table__.indexes:
+                if create:
+                    index.create(db.engine, checkfirst=True)
+                else:
+                    index.drop(db.engine, checkfirst=True)
+            db.session.execute(text('ANALYZE'))
+            db.session.commit()
+            print(f'{label} ({args.matches} matches, {args.players} players)')
+            for row in db.session.execute(text(plan_sql), {'p': player}):
+                print('   plan:', row[-1])
+            for name, fn in queries.items():
+                print(f'   {name:<16} {timed(fn, args.repeat):8.2f} ms')
+    os.remove(path)
+
+
+def orm_replay(k=32):
+    """The former backfill loop over ORM objects."""
+    ratings = {a.id: 1500 for a in Amiibo.query.all()}
+    rows = []
+    for m in Match.query.order_by(Match.id).all():
+        r1, r2 = ratings[m.player1_id], ratings[m.player2_id]
+        if m.draw:
+            score1 = 0.5
+        else:
+            score1 = 1 if m.winner_id == m.player1_id else 0
+        expected1 = 1 / (1 + 10 ** ((r2 - r1) / 400))
+        expected2 = 1 - expected1
+        r1 += int(k * (score1 - expected1))
+        r2 += int(k * ((1 - score1) - expected2))
+        ratings[m.player1_id] = r1
+        ratings[m.player2_id] = r2
+        rows.append({'amiibo_id': m.player1_id, 'match_id': m.id, 'rating': r1})
+        rows.append({'amiibo_id': m.player2_id, 'match_id': m.id, 'rating': r2})
+    return ratings, rows
+
+
+def bench_ratings(args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(path)
+    with app.app_context():
+        db.create_all()
+        fill_matches(args.players, args.matches)
+        print(f'{args.matches} matches, {args.players} players')
+        expected, _ = orm_replay()
+        current, _, _, _ = replay(load_match_log())
+        assert all(current.get(pid, 1500) == r for pid, r in expected.items())
+        for name, fn in (
+            ('orm loop', orm_replay),
+            ('load log', load_match_log),
+            ('engine', lambda: replay(load_match_log())),
+        ):
+            db.session.expunge_all()
+            print(f'   {name:<10} {timed(fn, args.repeat):8.1f} ms')
+        log = load_match_log()
+        print(f'   {"replay":<10} {timed(lambda: replay(log), args.repeat):8.1f} ms (log in memory)')
+    os.remove(path)
+
+
+def bench_glicko(args):
+    rng = random.Random(args.seed)
+    players = list(range(args.players))
+    print(f'{args.players} players, {args.periods} periods of one game each')
+    for backend in (EloBackend(), Glicko2Backend()):
+        ratings = {p: (1500.0, INITIAL_DEVIATION, INITIAL_VOLATILITY) for p in players}
+        samples = []
+        for _ in range(args.periods):
+            rng.shuffle(players)
+            games = []
+            for i in range(0, len(players) - 1, 2):
+                loser_stocks = rng.randint(0, 3)
+                winner_first = rng.random() < 0.5
+                games.append((players[i], players[i + 1]) + (
+                    (3, loser_stocks) if winner_first else (loser_stocks, 3)
+                ))
+            start = time.perf_counter()
+            ratings = backend.rate_period(ratings, games)
+            samples.append((time.perf_counter() - start) * 1000)
+        samples.sort()
+        spread = sorted(r for r, _, _ in ratings.values())
+        print(
+            f'   {backend.name:<8} median {samples[len(samples) // 2]:7.2f} ms/period  '
+            f'max {samples[-1]:7.2f} ms  rating range {spread[0]:.0f}-{spread[-1]:.0f}'
+        )
+
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    rank = max(1, -(-len(sorted_values) * pct // 100))
+    return sorted_values[int(rank) - 1]
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_tournament(args):
+    workdir = tempfile.mkdtemp()
+    os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(workdir, 'bench.db')
+    if args.tracemalloc:
+        tracemalloc.start()
+    import app as appmod
+    from models import SwissPairing, LeagueFixture, KnockoutMatch
+
+    app = appmod.app
+    client = app.test_client()
+    rng = random.Random(args.seed)
+    latencies = defaultdict(list)
+    queries = defaultdict(list)
+
+    def call(method, url, endpoint=None, **kwargs):
+        start = time.perf_counter()
+        response = client.open(url, method=method, **kwargs)
+        latencies[endpoint or url].append((time.perf_counter() - start) * 1000)
+        queries[endpoint or url].append(int(response.headers.get('X-SQL-Queries', 0)))
+        if response.status_code >= 400:
+            raise RuntimeError(f'{method} {url} -> {response.status_code}')
+        return response
+
+    def pending(model, *fields):
+        with app.app_context():
+            rows = model.query.filter_by(winner_id=None, draw=False).order_by(model.id).all()
+            return [{f: getattr(r, attr) for f, attr in fields} for r in rows]
+
+    def report(url, game):
+        s1, s2 = rng.randint(0, 3), rng.randint(0, 3)
+        call('POST', url, data=dict(game, score1=s1, score2=s2))
+
+    def browse():
+        for page in ('/leaderboard', '/swiss', '/league', '/knockout', '/seasons'):
+            call('GET', page)
+        call('GET', f'/amiibo/{rng.randint(1, args.players)}', '/amiibo/<id>')
+
+    players = [('player1', 'player1_id'), ('player2', 'player2_id')]
+    started = time.perf_counter()
+    call('POST', '/add_amiibos', data={'names': '\n'.join(f'P{i}' for i in range(args.players))})
+    call('POST', '/start_swiss')
+    while games := pending(SwissPairing, *players):
+        for game in games:
+            report('/report_swiss_result', game)
+        browse()
+    for _ in range(args.seasons):
+        while games := pending(LeagueFixture, ('league', 'league'), ('round', 'round_no'), *players):
+            for game in games:
+                report('/report_league_result', game)
+            browse()
+        call('POST', '/finish_league')
+        # finishing the last knockout archives the season and starts the next
+        while games := pending(KnockoutMatch, ('bracket', 'bracket'), *players):
+            for game in games:
+                report('/report_knockout_result', game)
+            browse()
+    total = time.perf_counter() - started
+
+    endpoints = {}
+    for name, samples in sorted(latencies.items()):
+        samples.sort()
+        counts = queries[name]
+        endpoints[name] = {
+            'calls': len(samples),
+            'p50_ms': round(percentile(samples, 50), 3),
+            'p90_ms': round(percentile(samples, 90), 3),
+            'p99_ms': round(percentile(samples, 99), 3),
+            'max_ms': round(samples[-1], 3),
+            'mean_ms': round(sum(samples) / len(samples), 3),
+            'sql_mean': round(sum(counts) / len(counts), 1),
+            'sql_max': max(counts),
+            'sql_total': sum(counts),
+        }
+    result = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'players': args.players,
+        'seasons': args.seasons,
+        'seed': args.seed,
+        'total_s': round(total, 3),
+        'peak_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        'endpoints': endpoints,
+    }
+    if args.tracemalloc:
+        result['peak_traced_kb'] = tracemalloc.get_traced_memory()[1] // 1024
+    text_out = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as fh:
+            fh.write(text_out + '\n')
+    else:
+        print(text_out)
+
+
+def greedy_pairs(ids, previous_matches, byes=()):
+    """The former first-fit pairing: forces a rematch when it gets stuck."""
+    unpaired = list(ids)
+    pairs = []
+    while len(unpaired) > 1:
+        p1 = unpaired.pop(0)
+        idx = 0
+        for i, p2 in enumerate(unpaired):
+            if (p1, p2) not in previous_matches and (p2, p1) not in previous_matches:
+                idx = i
+                break
+        pairs.append((p1, unpaired.pop(idx)))
+    return pairs, (unpaired[0] if unpaired else None)
+
+
+def simulate_swiss(pair, players, rounds, seed):
+    """Play ``rounds`` Swiss rounds with ``pair`` and collect quality stats."""
+    rng = random.Random(seed)
+    strength = {p: rng.gauss(1500, 200) for p in range(players)}
+    scores = dict.fromkeys(strength, 0.0)
+    previous, byes = set(), []
+    stats = {'pairing_ms': [], 'rematches': 0, 'repeat_byes': 0, 'score_gap': 0.0, 'games': 0}
+    for _ in range(rounds):
+        ranking = sorted(strength, key=lambda p: (-scores[p], -strength[p]))
+        start = time.perf_counter()
+        pairs, bye = pair(ranking, previous, byes)
+        stats['pairing_ms'].append((time.perf_counter() - start) * 1000)
+        if bye is not None:
+            stats['repeat_byes'] += bye in byes
+            byes.append(bye)
+            scores[bye] += 1
+        for a, b in pairs:
+            stats['rematches'] += (a, b) in previous or (b, a) in previous
+            stats['score_gap'] += abs(scores[a] - scores[b])
+            stats['games'] += 1
+            previous.add((a, b))
+            expected = 1 / (1 + 10 ** ((strength[b] - strength[a]) / 400))
+            roll = rng.random()
+            if abs(roll - expected) < 0.05:
+                scores[a] += 0.5
+                scores[b] += 0.5
+            else:
+                scores[a if roll < expected else b] += 1
+    return stats
+
+
+def bench_swiss(args):
+    print(f'{args.players} players, {args.rounds} rounds')
+    for name, pair in (('greedy', greedy_pairs), ('pairing', pair_round)):
+        stats = simulate_swiss(pair, args.players, args.rounds, args.seed)
+        times = sorted(stats['pairing_ms'])
+        print(
+            f'   {name:<8} max {times[-1]:8.2f} ms/round  total {sum(times):8.2f} ms  '
+            f'rematches {stats["rematches"]:4d}  repeat byes {stats["repeat_byes"]:3d}  '
+            f'mean score gap {stats["score_gap"] / stats["games"]:.3f}'
+        )
+
+
+def former_league_setup(group_size):
+    """The former setup: per-row ORM adds and a list rotation per round."""
+    LeagueFixture.query.delete()
+    LeagueStanding.query.delete()
+    players = Amiibo.query.all()
+    for idx, p in enumerate(players):
+        p.league = f'G{idx // group_size}'
+    db.session.flush()
+    players = Amiibo.query.all()
+    for g in sorted(set(p.league for p in players)):
+        ids = [p.id for p in players if p.league == g]
+        db.session.add_all(
+            LeagueStanding(league=g, amiibo_id=pid, score=0, diff=0, wins=0, sonneborn_berger=0)
+            for pid in ids
+        )
+        if len(ids) % 2 == 1:
+            ids.append(None)
+        n = len(ids)
+        for r in range(n - 1):
+            for i in range(n // 2):
+                p1, p2 = ids[i], ids[n - 1 - i]
+                if p1 is not None and p2 is not None:
+                    db.session.add(LeagueFixture(league=g, round_no=r + 1, player1_id=p1, player2_id=p2))
+            ids = [ids[0]] + [ids[-1]] + ids[1:-1]
+    db.session.commit()
+
+
+def bulk_league_setup(group_size, double=False):
+    """Setup as in ``start_leagues``: one snapshot, one insert per table."""
+    LeagueFixture.query.delete()
+    LeagueStanding.query.delete()
+    groups = {}
+    for idx, p in enumerate(Amiibo.query.all()):
+        p.league = f'G{idx // group_size}'
+        groups.setdefault(p.league, []).append(p.id)
+    db.session.execute(insert(LeagueStanding), [
+        {'league': g, 'amiibo_id': pid, 'score': 0, 'diff': 0, 'wins': 0, 'sonneborn_berger': 0}
+        for g, ids in groups.items()
+        for pid in ids
+    ])
+    db.session.execute(insert(LeagueFixture), group_fixtures(groups, double))
+    db.session.commit()
+
+
+def bench_fixtures(args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(path)
+    group_size = -(-args.players // args.groups)
+    with app.app_context():
+        db.create_all()
+        fill_matches(args.players, 0)
+        print(f'{args.players} players in {args.groups} groups of up to {group_size}')
+        groups = {g: list(range(g * group_size, (g + 1) * group_size)) for g in range(args.groups)}
+        print(f'   {"generate":<12} {timed(lambda: group_fixtures(groups), args.repeat):8.2f} ms (in memory)')
+        for name, fn in (
+            ('former', lambda: former_league_setup(group_size)),
+            ('bulk', lambda: bulk_league_setup(group_size)),
+            ('bulk double', lambda: bulk_league_setup(group_size, double=True)),
+        ):
+            db.session.expunge_all()
+            ms = timed(fn, args.repeat)
+            fixtures = db.session.scalar(text('SELECT count(*) FROM league_fixture'))
+            print(f'   {name:<12} {ms:8.1f} ms  {fixtures} fixtures')
+    os.remove(path)
+
+
+def fill_seasons(players, seasons):
+    """Archive ``seasons`` seasons with every player in a league table."""
+    db.session.execute(insert(Season), [
+        {'league_data': '{}', 'knockout_data': '{}'} for _ in range(seasons)
+    ])
+    db.session.execute(insert(SeasonStanding), [
+        {
+            'season_id': season, 'league': chr(65 + (pid - 1) // 4 % 26), 'position': (pid - 1) % 4 + 1,
+            'amiibo_id': pid, 'score': 0, 'diff': 0, 'wins': 0,
+        }
+        for season in range(1, seasons + 1)
+        for pid in range(1, players + 1)
+    ])
+    db.session.commit()
+
+
+def bench_startup(args):
+    path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+    app = make_app(path)
+    with app.app_context():
+        migrate()
+        fill_matches(args.players, args.matches)
+        fill_seasons(args.players, args.seasons)
+        print(f'{args.matches} matches, {args.players} players, {args.seasons} archived seasons')
+
+        def unversioned():
+            # a database without a schema version repeats every check
+            db.session.execute(delete(State).where(State.key == 'schema_version'))
+            db.session.commit()
+            migrate()
+            db.session.remove()
+
+        def versioned():
+            migrate()
+            db.session.remove()
+
+        for name, fn in (('unversioned', unversioned), ('versioned', versioned)):
+            print(f'   {name:<12} {timed(fn, args.repeat):8.2f} ms  schema work')
+    env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI='sqlite:///' + path)
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    def import_app():
+        subprocess.run([sys.executable, '-c', 'import app'], cwd=here, env=env, check=True)
+
+    print(f'   {"import app":<12} {timed(import_app, args.repeat):8.1f} ms  new process, versioned')
+    os.remove(path)
+
+
+def load_role(args):
+    """One process of the load test: set up the data, read pages or report matches."""
+    import app as appmod
+
+    client = appmod.app.test_client()
+    rng = random.Random(args.seed)
+    if args.role == 'setup':
+        client.post('/add_amiibos', data={'names': '\n'.join(f'P{i}' for i in range(args.players))})
+        for _ in range(args.players * 4):
+            p1, p2 = rng.sample(range(1, args.players + 1), 2)
+            client.post('/report_match', data={'player1': p1, 'player2': p2, 'score1': 3, 'score2': 1})
+        return
+    pages = ['/leaderboard', '/match', '/api/v1/matches', '/api/v1/amiibos']
+    latencies = []
+    errors = 0
+    # report ready, then wait until every process is ready too
+    print('ready', flush=True)
+    sys.stdin.readline()
+    start = time.perf_counter()
+    while time.perf_counter() < start + args.duration:
+        started = time.perf_counter()
+        if args.role == 'writer':
+            p1, p2 = rng.sample(range(1, args.players + 1), 2)
+            s1, s2 = rng.randint(0, 3), rng.randint(0, 3)
+            response = client.post(
+                '/report_match', data={'player1': p1, 'player2': p2, 'score1': s1, 'score2': s2}
+            )
+        else:
+            page = rng.choice(pages + [f'/amiibo/{rng.randint(1, args.players)}'])
+            response = client.get(page)
+        latencies.append((time.perf_counter() - started) * 1000)
+        errors += response.status_code >= 400
+    print(json.dumps({'latencies': latencies, 'errors': errors}))
+
+
+def bench_load(args):
+    here = os.path.abspath(__file__)
+    base = [sys.executable, here, 'load', '--players', str(args.players)]
+    print(f'{args.readers} readers, {args.writers} writers, {args.duration} s, {args.players} players')
+    # the baseline is the app without its profile: no pragmas, SQLAlchemy's own pool
+    profiles = (
+        ('sqlite defaults', {'FLASK_SQLITE_PRAGMAS': '{}', 'FLASK_SQLALCHEMY_ENGINE_OPTIONS': '{}'}),
+        ('app profile', {}),
+    )
+    for name, overrides in profiles:
+        path = os.path.join(tempfile.mkdtemp(), 'bench.db')
+        env = dict(os.environ, FLASK_SQLALCHEMY_DATABASE_URI='sqlite:///' + path, **overrides)
+        subprocess.run(base + ['--role', 'setup'], env=env, check=True)
+        roles = ['reader'] * args.readers + ['writer'] * args.writers
+        procs = [
+            subprocess.Popen(
+                base + ['--role', role, '--seed', str(n), '--duration', str(args.duration)],
+                env=env, stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+            )
+            for n, role in enumerate(roles)
+        ]
+        # the clock starts once every process has imported the app
+        for proc in procs:
+            proc.stdout.readline()
+        for proc in procs:
+            proc.stdin.write('go\n')
+            proc.stdin.flush()
+        results = defaultdict(lambda: {'latencies': [], 'errors': 0})
+        for role, proc in zip(roles, procs):
+            out = json.loads(proc.communicate()[0])
+            results[role]['latencies'] += out['latencies']
+            results[role]['errors'] += out['errors']
+        print(f'   {name}')
+        for role in ('reader', 'writer'):
+            samples = sorted(results[role]['latencies'])
+            if not samples:
+                continue
+            print(
+                f'      {role + "s":<8} {len(samples) / args.duration:8.1f} req/s  '
+                f'p50 {percentile(samples, 50):7.1f} ms  p99 {percentile(samples, 99):7.1f} ms  '
+                f'errors {results[role]["errors"]}'
+            )
+        os.remove(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    sub = parser.add_subparsers(dest='command', required=True)
+    idx = sub.add_parser('indexes', help='per-player lookups with and without indexes')
+    idx.add_argument('--players', type=int, default=1000)
+    idx.add_argument('--matches', type=int, default=100_000)
+    idx.add_argument('--repeat', type=int, default=20)
+    idx.set_defaults(func=bench_indexes)
+    tour = sub.add_parser('tournament', help='full Swiss, league and knockout cycles')
+    tour.add_argument('--players', type=int, default=64)
+    tour.add_argument('--seasons', type=int, default=2)
+    tour.add_argument('--seed', type=int, default=1)
+    tour.add_argument('--output', help='write JSON here instead of stdout')
+    tour.add_argument('--tracemalloc', action='store_true',
+                      help='also report peak Python heap (slower)')
+    tour.set_defaults(func=bench_tournament)
+    swiss = sub.add_parser('swiss', help='Swiss pairing engine against greedy first-fit')
+    swiss.add_argument('--players', type=int, default=1001)
+    swiss.add_argument('--rounds', type=int, default=9)
+    swiss.add_argument('--seed', type=int, default=1)
+    swiss.set_defaults(func=bench_swiss)
+    elo = sub.add_parser('ratings', help='full Elo replay, engine against ORM loop')
+    elo.add_argument('--players', type=int, default=1000)
+    elo.add_argument('--matches', type=int, default=100_000)
+    elo.add_argument('--repeat', type=int, default=3)
+    elo.set_defaults(func=bench_ratings)
+    glicko = sub.add_parser('glicko', help='Glicko-2 rating periods against per-match Elo')
+    glicko.add_argument('--players', type=int, default=5000)
+    glicko.add_argument('--periods', type=int, default=10)
+    glicko.add_argument('--seed', type=int, default=1)
+    glicko.set_defaults(func=bench_glicko)
+    fix = sub.add_parser('fixtures', help='league setup, bulk round-robin against per-row loop')
+    fix.add_argument('--players', type=int, default=500)
+    fix.add_argument('--groups', type=int, default=125)
+    fix.add_argument('--repeat', type=int, default=5)
+    fix.set_defaults(func=bench_fixtures)
+    start = sub.add_parser('startup', help='startup schema work with and without a recorded version')
+    start.add_argument('--players', type=int, default=2000)
+    start.add_argument('--matches', type=int, default=200_000)
+    start.add_argument('--seasons', type=int, default=200)
+    start.add_argument('--repeat', type=int, default=5)
+    start.set_defaults(func=bench_startup)
+    load = sub.add_parser('load', help='concurrent readers and writers, SQLite defaults against the app profile')
+    load.add_argument('--readers', type=int, default=4)
+    load.add_argument('--writers', type=int, default=2)
+    load.add_argument('--duration', type=float, default=10)
+    load.add_argument('--players', type=int, default=64)
+    load.add_argument('--role', choices=['setup', 'reader', 'writer'], help=argparse.SUPPRESS)
+    load.add_argument('--seed', type=int, default=0, help=argparse.SUPPRESS)
+    load.set_defaults(func=bench_load)
+    args = parser.parse_args()
+    if getattr(args, 'role', None):
+        load_role(args)
+    else:
+        args.func(args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""Single-elimination brackets as array-indexed binary trees.
+
+A bracket with ``size`` leaves (a power of two) is a list of
+``2 * size - 1`` slots in heap order: node ``i`` has the children
+``2i + 1`` and ``2i + 2``, the root 0 is the final and the last ``size``
+slots hold the players in seeded order, None marking a bye. An inner node
+holds the winner of the game between its children once it is decided, so
+placing a result, finding the next game and advancing a player are index
+arithmetic. Round ``r`` of ``R`` rounds is the tree level ``R - r``; a
+game's ``slot`` is its position within that level.
+"""
+
+
+def seed_order(size):
+    """Return the seeds (1 = best) of the leaves for a bracket of ``size``.
+
+    Seeds 1 and 2 can only meet in the final, 1-4 only from the semifinals
+    on, and so on; byes therefore go to the top seeds.
+    """
+    order = [1]
+    while len(order) < size:
+        n = 2 * len(order)
+        order = [s for seed in order for s in (seed, n + 1 - seed)]
+    return order
+
+
+def build(ids):
+    """Return the tree for ``ids`` listed best seed first.
+
+    Players with a bye are advanced to their round 1 node right away.
+    """
+    size = 1
+    while size < len(ids):
+        size *= 2
+    leaves = [ids[seed - 1] if seed <= len(ids) else None for seed in seed_order(size)]
+    tree = [None] * (size - 1) + leaves
+    if size > 1:
+        for i in range(size // 2 - 1, size - 1):
+            p1, p2 = game(tree, i)
+            if p1 is None or p2 is None:
+                tree[i] = p1 if p2 is None else p2
+    return tree
+
+
+def rounds(tree):
+    """Number of rounds of the bracket."""
+    return ((len(tree) + 1) // 2).bit_length() - 1
+
+
+def node(tree, round_no, slot):
+    """Index of the game in ``slot`` of round ``round_no``."""
+    return (1 << (rounds(tree) - round_no)) - 1 + slot
+
+
+def round_nodes(tree, round_no):
+    """Indices of all games of round ``round_no``, in slot order."""
+    first = node(tree, round_no, 0)
+    return range(first, 2 * first + 1)
+
+
+def game(tree, i):
+    """The two players (or None) meeting in the game at node ``i``."""
+    return tree[2 * i + 1], tree[2 * i + 2]
+
+
+def place(tree, i, winner):
+    """Store the winner of the game at node ``i``, advancing them."""
+    if winner not in game(tree, i):
+        raise ValueError(f'{winner} does not play in game {i}')
+    tree[i] = winner
+
+
+def round_done(tree, round_no):
+    """Whether every game of round ``round_no`` has a winner."""
+    return all(tree[i] is not None for i in round_nodes(tree, round_no))
+
+
+def champion(tree):
+    """The winner of the final, or None."""
+    return tree[0] if len(tree) > 1 else None
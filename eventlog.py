@@ -0,0 +1,89 @@
+"""Snapshots of the tournament state for replaying the action log.
+
+Every state-changing request is stored as an ``Action`` in the same
+transaction as its effects. A ``Snapshot`` copies the mutable tables
+(Amiibos, Swiss, league and knockout structures, Glicko state and the
+State keys) in full; append-only tables such as matches and rating history
+only record their highest id, and restoring deletes anything newer. State
+is rebuilt by restoring the latest snapshot and applying the actions after
+it, so only the tail of the log is ever replayed.
+"""
+import json
+
+from sqlalchemy import delete, func, insert, select
+
+from models import db, Action, Snapshot, State
+from models import Amiibo, Match, RatingHistory, GlickoRating, Title
+from models import Season, SeasonStanding, SeasonChampion
+from models import SwissStanding, SwissPairing, LeagueStanding, LeagueFixture
+from models import KnockoutBracket, KnockoutMatch
+
+# tables copied whole into every snapshot
+COPIED_TABLES = (
+    Amiibo, GlickoRating, SwissStanding, SwissPairing,
+    LeagueStanding, LeagueFixture, KnockoutBracket, KnockoutMatch,
+)
+# tables that only grow; a snapshot keeps their highest id
+APPENDED_TABLES = (Match, RatingHistory, Season, SeasonStanding, SeasonChampion, Title)
+# State keys owned by the write path and migrations rather than the tournament
+VOLATILE_STATE = ('version', 'modified_at', 'schema_version')
+# snapshots kept; undo can reach back to the oldest of them
+SNAPSHOT_KEEP = 5
+
+
+def take_snapshot():
+    """Store the current state as of the newest logged action."""
+    data = {'tables': {}, 'last_ids': {}}
+    for model in COPIED_TABLES:
+        table = model.__table__
+        data['tables'][table.name] = [dict(row) for row in db.session.execute(select(table)).mappings()]
+    for model in APPENDED_TABLES:
+        data['last_ids'][model.__tablename__] = db.session.scalar(select(func.max(model.id))) or 0
+    data['state'] = {
+        key: value
+        for key, value in db.session.execute(select(State.key, State.value))
+        if key not in VOLATILE_STATE
+    }
+    action_id = db.session.scalar(select(func.max(Action.id))) or 0
+    db.session.add(Snapshot(action_id=action_id, data=json.dumps(data)))
+    oldest = db.session.scalars(
+        select(Snapshot.id).order_by(Snapshot.id.desc()).offset(SNAPSHOT_KEEP - 1).limit(1)
+    ).first()
+    if oldest is not None:
+        db.session.execute(delete(Snapshot).where(Snapshot.id < oldest))
+    db.session.flush()
+
+
+def restore_snapshot(snapshot):
+    """Put the tables back into the state recorded by ``snapshot``.
+
+    The caller expires the session and any cached Amiibos afterwards.
+    """
+    data = json.loads(snapshot.data)
+    for model in reversed(COPIED_TABLES):
+        db.session.execute(delete(model))
+    for model in COPIED_TABLES:
+        rows = data['tables'][model.__tablename__]
+        if rows:
+            db.session.execute(insert(model.__table__), rows)
+    for model in APPENDED_TABLES:
+        db.session.execute(delete(model).where(model.id > data['last_ids'][model.__tablename__]))
+    db.session.execute(delete(State).where(State.key.not_in(VOLATILE_STATE)))
+    if data['state']:
+        db.session.execute(
+            insert(State), [{'key': key, 'value': value} for key, value in data['state'].items()]
+        )
+    db.session.expire_all()
+
+
+def latest_snapshot(before=None):
+    """The newest snapshot, or the newest taken before action ``before``."""
+    query = select(Snapshot).order_by(Snapshot.action_id.desc(), Snapshot.id.desc())
+    if before is not None:
+        query = query.where(Snapshot.action_id < before)
+    return db.session.scalars(query.limit(1)).first()
+
+
+def actions_after(action_id):
+    """Logged actions newer than ``action_id``, oldest first."""
+    return db.session.scalars(select(Action).where(Action.id > action_id).order_by(Action.id)).all()
@@ -0,0 +1,44 @@
+"""Round-robin fixtures for league groups.
+
+Uses the circle method: the first player stays in place while the others
+rotate one seat per round, so every pair meets once in ``n - 1`` rounds
+(``n`` rounded up to even; whoever faces the empty seat has a bye). Seats
+are computed from the round number instead of rotating a list, and a
+double round-robin repeats the rounds with the sides swapped.
+"""
+
+
+def round_robin(ids, double=False):
+    """Return the rounds of ``(player1, player2)`` pairs for one group."""
+    ids = list(ids)
+    if len(ids) % 2:
+        ids.append(None)
+    n = len(ids)
+    rounds = []
+    for r in range(n - 1):
+        # seat k > 0 holds the player who started in seat 1 + (k - 1 - r) mod (n - 1)
+        seat = [ids[0]] + [ids[1 + (k - 1 - r) % (n - 1)] for k in range(1, n)]
+        rounds.append([
+            (seat[i], seat[n - 1 - i])
+            for i in range(n // 2)
+            if seat[i] is not None and seat[n - 1 - i] is not None
+        ])
+    if double:
+        rounds += [[(p2, p1) for p1, p2 in pairs] for pairs in rounds]
+    return rounds
+
+
+def group_fixtures(groups, double=False):
+    """Return fixture rows for all groups, ready for one bulk insert.
+
+    ``groups`` maps a league to its player IDs in seeding order; groups
+    may differ in size.
+    """
+    rows = []
+    for league, ids in groups.items():
+        for round_no, pairs in enumerate(round_robin(ids, double), 1):
+            rows.extend(
+                {'league': league, 'round_no': round_no, 'player1_id': p1, 'player2_id': p2}
+                for p1, p2 in pairs
+            )
+    return rows
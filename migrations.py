@@ -0,0 +1,344 @@
+"""Versioned schema and data migrations, run once per database.
+
+The number of migrations applied is kept in the ``schema_version`` State
+key, so an up-to-date database costs one lookup at startup instead of
+probing every table. A migration is appended to ``MIGRATIONS`` and never reordered
+or removed. Databases from before the versioning start at 0 and run them
+all, which is why the column migrations check whether the column is
+already there.
+"""
+import json
+
+from sqlalchemy import inspect, insert, select, text
+
+from models import db, Amiibo, Match, State, Title, Snapshot, upsert
+from models import Season, SeasonStanding, SeasonChampion, refresh_titles, store_season_results
+from models import SwissStanding, SwissPairing, LeagueStanding, LeagueFixture
+from models import KnockoutBracket, KnockoutMatch
+from eventlog import take_snapshot
+import bracket
+import standings
+
+
+def schema_version():
+    """Number of migrations the database has applied; 0 for new and unversioned ones."""
+    if not inspect(db.session.connection()).has_table(State.__tablename__):
+        return 0
+    return stored_state('schema_version', 0)
+
+
+def record_schema_version(number):
+    """Store the number of migrations applied; the caller commits."""
+    db.session.execute(
+        upsert(State, ['key'], ['value']), {'key': 'schema_version', 'value': json.dumps(number)}
+    )
+
+
+def stored_state(key, default):
+    """Decoded value of a State key, or ``default``."""
+    entry = db.session.get(State, key)
+    if not entry:
+        return default
+    try:
+        return json.loads(entry.value)
+    except Exception:
+        return default
+
+
+def add_column(table, column, ddl):
+    """Add ``column`` to ``table`` unless it exists; return whether it was added."""
+    existing = {c['name'] for c in inspect(db.session.connection()).get_columns(table)}
+    if column in existing:
+        return False
+    db.session.execute(text(f'ALTER TABLE {table} ADD COLUMN {column} {ddl}'))
+    return True
+
+
+# tournament structures that older versions kept as JSON blobs in State
+LEGACY_STATE_KEYS = (
+    'current_pairs', 'current_swiss_pairs', 'swiss_scores', 'swiss_diff',
+    'swiss_wins', 'swiss_opponents', 'swiss_previous_matches',
+    'league_matches', 'league_scores', 'league_diff', 'league_wins',
+    'league_results', 'knockout_brackets', 'knockout_remaining',
+    'knockout_history',
+)
+
+
+def migrate_state_blobs():
+    """Convert legacy JSON state blobs into the relational tables once."""
+    if not State.query.filter(State.key.in_(LEGACY_STATE_KEYS)).first():
+        return
+    round_no = stored_state('swiss_round', 0)
+    diffs = stored_state('swiss_diff', {})
+    wins = stored_state('swiss_wins', {})
+    for pid, score in stored_state('swiss_scores', {}).items():
+        db.session.add(SwissStanding(
+            amiibo_id=int(pid), score=score,
+            diff=diffs.get(pid, 0), wins=wins.get(pid, 0),
+        ))
+    current = [tuple(p) for p in stored_state('current_swiss_pairs', [])]
+    current_keys = {(p1, p2) for p1, p2, _ in current}
+    # earlier rounds only kept the pairing, so take round and result from the
+    # Swiss match of that pair: it was recorded with its round number, which
+    # is below the current round (friendlies default to round 1, so a later
+    # round wins a tie and round 1 goes to the earliest match)
+    for p1, p2 in stored_state('swiss_previous_matches', []):
+        if (p1, p2) in current_keys:
+            continue
+        m = (
+            Match.query.filter_by(player1_id=p1, player2_id=p2)
+            .filter(Match.round_no >= 1, Match.round_no < round_no)
+            .order_by(Match.round_no.desc(), Match.id)
+            .first()
+        )
+        # without its match the result is unknown, not a draw
+        result = None
+        if m:
+            result = 'draw' if m.draw else m.winner_id
+        db.session.add(SwissPairing(
+            round_no=m.round_no if m else 0, player1_id=p1, player2_id=p2, result=result,
+        ))
+    for p1, p2, w in current:
+        db.session.add(SwissPairing(round_no=round_no, player1_id=p1, player2_id=p2, result=w))
+
+    for lg, rounds in stored_state('league_matches', {}).items():
+        for rnd in sorted(rounds, key=int):
+            for p1, p2, w in rounds[rnd]:
+                db.session.add(LeagueFixture(
+                    league=lg, round_no=int(rnd), player1_id=p1, player2_id=p2, result=w,
+                ))
+    diffs = stored_state('league_diff', {})
+    wins = stored_state('league_wins', {})
+    for lg, scores in stored_state('league_scores', {}).items():
+        for pid, score in scores.items():
+            db.session.add(LeagueStanding(
+                league=lg, amiibo_id=int(pid), score=score,
+                diff=diffs.get(lg, {}).get(pid, 0), wins=wins.get(lg, {}).get(pid, 0),
+            ))
+
+    brackets = stored_state('knockout_brackets', {})
+    remaining = stored_state('knockout_remaining', {})
+    for key, rounds in stored_state('knockout_history', {}).items():
+        rounds = [rnd for rnd in rounds if rnd]
+        champion = None
+        if not brackets.get(key) and len(remaining.get(key, [])) == 1:
+            champion = remaining[key][0]
+        db.session.add(KnockoutBracket(key=key, round_no=max(len(rounds), 1), champion_id=champion))
+        for rnd, matches in enumerate(rounds, start=1):
+            slot = -1
+            previous = None
+            for p1, p2, w in matches:
+                # a drawn game is directly followed by its rematch
+                if previous != (p1, p2, 'draw'):
+                    slot += 1
+                previous = (p1, p2, w)
+                db.session.add(KnockoutMatch(
+                    bracket=key, round_no=rnd, slot=slot,
+                    player1_id=p1, player2_id=p2, result=w,
+                ))
+    State.query.filter(State.key.in_(LEGACY_STATE_KEYS)).delete(synchronize_session=False)
+    db.session.flush()
+    recompute_tiebreaks()
+
+
+def recompute_tiebreaks():
+    """Rebuild the stored Buchholz and Sonneborn-Berger values from scratch."""
+    opponents = {}
+    for p in SwissPairing.query:
+        if p.points:
+            opponents.setdefault(p.player1_id, set()).add(p.player2_id)
+            opponents.setdefault(p.player2_id, set()).add(p.player1_id)
+    swiss_rows = SwissStanding.query.all()
+    buchholz = standings.buchholz({s.amiibo_id: s.score for s in swiss_rows}, opponents)
+    for s in swiss_rows:
+        s.buchholz = buchholz[s.amiibo_id]
+    results = {}
+    for f in LeagueFixture.query:
+        if f.points:
+            pts1, pts2 = f.points
+            results.setdefault(f.player1_id, []).append((f.player2_id, pts1))
+            results.setdefault(f.player2_id, []).append((f.player1_id, pts2))
+    league_rows = LeagueStanding.query.all()
+    by_league = {}
+    for s in league_rows:
+        by_league.setdefault(s.league, {})[s.amiibo_id] = s.score
+    sb = {}
+    for table in by_league.values():
+        sb.update(standings.sonneborn_berger(table, results))
+    for s in league_rows:
+        s.sonneborn_berger = sb[s.amiibo_id]
+
+
+def migrate_season_archive():
+    """Materialize standings of seasons archived only as JSON."""
+    archived = select(SeasonStanding.season_id).union(select(SeasonChampion.season_id))
+    for s in Season.query.filter(Season.id.not_in(archived)).order_by(Season.id):
+        league = json.loads(s.league_data)
+        knockout = json.loads(s.knockout_data)
+        # JSON turned the player IDs into strings
+        scores, diffs, wins = (
+            {
+                lg: {int(pid): val for pid, val in table.items()}
+                for lg, table in league.get(key, {}).items()
+            }
+            for key in ('scores', 'diff', 'wins')
+        )
+        results = {
+            int(pid): [(int(o), r) for o, r in lst]
+            for pid, lst in league.get('results', {}).items()
+        }
+        champions = {key: w[0] if w else None for key, w in knockout.get('winners', {}).items()}
+        tiebreaks = {lg: standings.sonneborn_berger(table, results) for lg, table in scores.items()}
+        store_season_results(s.id, scores, diffs, wins, tiebreaks, champions)
+
+
+def migrate_bracket_trees():
+    """Build the tree of brackets started before trees were stored.
+
+    Those brackets always had 4 or 8 players. The leaves are ordered so
+    that every game played so far is between sibling nodes, and the
+    slots of the stored games are renumbered to match.
+    """
+    for row in KnockoutBracket.query.filter(KnockoutBracket.tree.is_(None)).all():
+        games = KnockoutMatch.query.filter_by(bracket=row.key).order_by(
+            KnockoutMatch.round_no, KnockoutMatch.slot, KnockoutMatch.id
+        ).all()
+        results = {(m.round_no, m.player1_id, m.player2_id): m.winner_id for m in games if m.winner_id}
+        came_from = {(r, winner): (p1, p2) for (r, p1, p2), winner in results.items()}
+
+        def leaves(round_no, pid):
+            if round_no == 0:
+                return [pid]
+            p1, p2 = came_from[(round_no, pid)]
+            return leaves(round_no - 1, p1) + leaves(round_no - 1, p2)
+
+        ids = []
+        for m in games:
+            if m.round_no == row.round_no and m.player1_id not in ids:
+                ids += leaves(row.round_no - 1, m.player1_id) + leaves(row.round_no - 1, m.player2_id)
+        tree = [None] * (len(ids) - 1) + ids
+        slots = {}
+        for round_no in range(1, bracket.rounds(tree) + 1):
+            for slot, i in enumerate(bracket.round_nodes(tree, round_no)):
+                pair = (round_no,) + bracket.game(tree, i)
+                slots[pair] = slot
+                tree[i] = results.get(pair)
+        for m in games:
+            m.slot = slots[(m.round_no, m.player1_id, m.player2_id)]
+            # blob-era rematches left a copy of the game open once it was won
+            if m.result is None and tree[bracket.node(tree, m.round_no, m.slot)] is not None:
+                db.session.delete(m)
+        row.tree = json.dumps(tree)
+
+
+def migrate_titles():
+    """Create Title rows from the comma separated title strings.
+
+    Seasons are matched in order against the archived league winners
+    and bracket champions; titles without an archive entry get none.
+    """
+    seasons = {}
+    for c in SeasonChampion.query.filter(SeasonChampion.amiibo_id.isnot(None)).order_by(SeasonChampion.season_id):
+        seasons.setdefault(('ko', c.amiibo_id, c.bracket), []).append(c.season_id)
+    for w in SeasonStanding.query.filter_by(position=1).order_by(SeasonStanding.season_id):
+        seasons.setdefault(('league', w.amiibo_id, w.league), []).append(w.season_id)
+    rows = []
+    for a in Amiibo.query:
+        for kind, titles in (('ko', a.ko_titles), ('league', a.league_titles)):
+            for key in (t.strip() for t in (titles or '').split(',')):
+                if key:
+                    won = seasons.get((kind, a.id, key))
+                    rows.append({
+                        'amiibo_id': a.id, 'kind': kind, 'key': key,
+                        'season_id': won.pop(0) if won else None,
+                    })
+    if rows:
+        db.session.execute(insert(Title), rows)
+    refresh_titles()
+
+
+def add_waiting():
+    add_column('amiibo', 'waiting', 'BOOLEAN DEFAULT FALSE')
+
+
+def add_draw():
+    add_column('match', 'draw', 'BOOLEAN DEFAULT FALSE')
+
+
+def add_profile_pic():
+    add_column('amiibo', 'profile_pic', "VARCHAR(120) DEFAULT ''")
+
+
+def add_scores():
+    add_column('match', 'score1', 'INTEGER DEFAULT 0')
+    add_column('match', 'score2', 'INTEGER DEFAULT 0')
+
+
+def add_league_titles():
+    add_column('amiibo', 'league_titles', "VARCHAR(120) DEFAULT ''")
+
+
+def add_tiebreaks():
+    """Store Buchholz and Sonneborn-Berger with the standings."""
+    added = add_column('swiss_standing', 'buchholz', 'FLOAT NOT NULL DEFAULT 0')
+    added |= add_column('league_standing', 'sonneborn_berger', 'FLOAT NOT NULL DEFAULT 0')
+    if added:
+        recompute_tiebreaks()
+
+
+def create_indexes():
+    """Create model indexes; create_all() skips them on tables that already existed."""
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.session.connection(), checkfirst=True)
+
+
+def add_titles():
+    """Cache the title on the Amiibo and store one Title row per title won."""
+    if add_column('amiibo', 'title', "VARCHAR(2) NOT NULL DEFAULT ''"):
+        migrate_titles()
+
+
+def add_bracket_trees():
+    add_column('knockout_bracket', 'tree', 'TEXT')
+    migrate_bracket_trees()
+
+
+def snapshot_baseline():
+    """Start the action log from the current state."""
+    if not db.session.scalar(select(Snapshot.id).limit(1)):
+        take_snapshot()
+
+
+MIGRATIONS = [
+    add_waiting,
+    add_draw,
+    add_profile_pic,
+    add_scores,
+    add_league_titles,
+    add_tiebreaks,
+    create_indexes,
+    migrate_state_blobs,
+    migrate_season_archive,
+    add_titles,
+    add_bracket_trees,
+    snapshot_baseline,
+]
+
+
+def migrate():
+    """Bring the database up to the latest version; return the migrations run.
+
+    Each migration commits together with the new version number, so an
+    interrupted upgrade resumes where it stopped.
+    """
+    version = schema_version()
+    if version >= len(MIGRATIONS):
+        return 0
+    db.create_all()
+    db.session.execute(upsert(State, ['key']), {'key': 'version', 'value': '0'})
+    for number, step in enumerate(MIGRATIONS[version:], version + 1):
+        step()
+        record_schema_version(number)
+        db.session.commit()
+    return len(MIGRATIONS) - version
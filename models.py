@@ -1,7 +1,37 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import case, func, insert, select, union_all
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+
+import standings
 
 db = SQLAlchemy()
 
+# (title, minimum peak Elo, bracket letter, knockout titles at that level or better)
+TITLE_RULES = (('GM', 2000, 'A', 3), ('IM', 1900, 'C', 2), ('FM', 1800, 'E', 1))
+TITLE_ELO = sorted(rule[1] for rule in TITLE_RULES)
+
+
+def bracket_level(bracket: str) -> int:
+    """Return the level of a bracket key: 0 for A, 1 for B, ... (best letter wins)."""
+    letters = [ord(c.upper()) - 65 for c in bracket if c.isalpha()]
+    return min(letters) if letters else 100
+
+
+def compute_title(peak_elo: int, ko_brackets) -> str:
+    """Return the highest title earned with ``peak_elo`` and the won brackets."""
+    levels = [bracket_level(b) for b in ko_brackets]
+    for title, elo, letter, needed in TITLE_RULES:
+        best = bracket_level(letter)
+        if peak_elo >= elo and sum(1 for level in levels if level <= best) >= needed:
+            return title
+    return ""
+
+
+def crosses_title_elo(old_peak: int, new_peak: int) -> bool:
+    """Whether a peak Elo change can change the title."""
+    return any(old_peak < elo <= new_peak for elo in TITLE_ELO)
+
+
 class Amiibo(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(80), unique=True, nullable=False)
@@ -12,54 +42,15 @@ class Amiibo(db.Model):
     league_titles = db.Column(db.String(120), default="")
     waiting = db.Column(db.Boolean, default=False)
     profile_pic = db.Column(db.String(120), default="")
-
-    @property
-    def title(self) -> str:
-        """Return the highest achieved title according to Elo and KO wins."""
-        def bracket_level(bracket: str) -> int:
-            letters = [ord(c.upper()) - 65 for c in bracket if c.isalpha()]
-            return min(letters) if letters else 100
-
-        wins = [b.strip() for b in self.ko_titles.split(',') if b.strip()]
-        levels = [bracket_level(b) for b in wins]
-
-        gm = self.peak_elo >= 2000 and sum(1 for l in levels if l <= bracket_level('A')) >= 3
-        im = self.peak_elo >= 1900 and sum(1 for l in levels if l <= bracket_level('C')) >= 2
-        fm = self.peak_elo >= 1800 and any(l <= bracket_level('E') for l in levels)
-
-        if gm:
-            return "GM"
-        if im:
-            return "IM"
-        if fm:
-            return "FM"
-        return ""
+    # highest title from peak Elo and Title rows, kept by refresh_titles()
+    title = db.Column(db.String(2), nullable=False, default="")
 
     def record(self, last_n: int | None = None) -> tuple[int, int, int]:
         """Return (wins, draws, losses) optionally limited to last_n matches."""
-        query = Match.query.filter(
-            (Match.player1_id == self.id) | (Match.player2_id == self.id)
-        ).order_by(Match.id.desc())
-        if last_n:
-            matches = query.limit(last_n).all()
-        else:
-            matches = query.all()
-        wins = draws = losses = 0
-        for m in matches:
-            if m.draw:
-                draws += 1
-            elif m.winner_id == self.id:
-                wins += 1
-            else:
-                losses += 1
-        return wins, draws, losses
+        return match_records(last_n, [self.id]).get(self.id, (0, 0, 0))
 
     def win_percentage(self, last_n: int | None = None) -> float:
-        wins, draws, losses = self.record(last_n)
-        total = wins + draws + losses
-        if total == 0:
-            return 0.0
-        return round(((wins + 0.5 * draws) / total) * 100, 1)
+        return win_percentage(*self.record(last_n))
 
 class Match(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -71,6 +62,144 @@ class Match(db.Model):
     score1 = db.Column(db.Integer, default=0)
     score2 = db.Column(db.Integer, default=0)
 
+    # per-player history is looked up on either side, newest match first
+    __table_args__ = (
+        db.Index('ix_match_player1_id', 'player1_id', 'id'),
+        db.Index('ix_match_player2_id', 'player2_id', 'id'),
+    )
+
+
+class RatingHistory(db.Model):
+    """Rating of an Amiibo after each match it played."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    amiibo_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    match_id = db.Column(db.Integer, db.ForeignKey('match.id'), nullable=False)
+    rating = db.Column(db.Integer, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_rating_history_amiibo_match', 'amiibo_id', 'match_id'),
+    )
+
+
+class LiveEvent(db.Model):
+    """Result or round event for the live feed, written with the change itself."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+
+
+class GlickoRating(db.Model):
+    """Glicko-2 state of an Amiibo; the rating itself is mirrored to ``current_elo``."""
+
+    amiibo_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), primary_key=True)
+    rating = db.Column(db.Float, nullable=False)
+    deviation = db.Column(db.Float, nullable=False)
+    volatility = db.Column(db.Float, nullable=False)
+
+
+class Action(db.Model):
+    """A state-changing request, logged with its parsed input for replay."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    kind = db.Column(db.String(30), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.Float, nullable=False)
+
+
+class Snapshot(db.Model):
+    """Tournament state as it was after the action ``action_id`` (0 = before any)."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    action_id = db.Column(db.Integer, nullable=False, index=True)
+    data = db.Column(db.Text, nullable=False)
+
+
+def match_records(
+    last_n: int | None = None,
+    amiibo_ids: list[int] | None = None,
+) -> dict[int, tuple[int, int, int]]:
+    """Return ``{amiibo_id: (wins, draws, losses)}`` in a single grouped query.
+
+    Every match is unfolded into one row per participant. With ``last_n`` a
+    ``ROW_NUMBER()`` window over each player's matches (newest first) keeps
+    only their most recent ``last_n`` results before aggregating.
+    """
+    sides = []
+    for column in (Match.player1_id, Match.player2_id):
+        side = select(
+            column.label('amiibo_id'),
+            Match.id.label('match_id'),
+            Match.winner_id.label('winner_id'),
+            Match.draw.label('draw'),
+        )
+        if amiibo_ids is not None:
+            side = side.where(column.in_(amiibo_ids))
+        sides.append(side)
+    played = union_all(*sides).subquery()
+    if last_n:
+        ranked = select(
+            played,
+            func.row_number().over(
+                partition_by=played.c.amiibo_id,
+                order_by=played.c.match_id.desc(),
+            ).label('rn'),
+        ).subquery()
+        played = select(ranked).where(ranked.c.rn <= last_n).subquery()
+    query = select(
+        played.c.amiibo_id,
+        func.sum(case((played.c.draw, 0), (played.c.winner_id == played.c.amiibo_id, 1), else_=0)),
+        func.sum(case((played.c.draw, 1), else_=0)),
+        func.count(),
+    ).group_by(played.c.amiibo_id)
+    return {
+        pid: (wins, draws, total - wins - draws)
+        for pid, wins, draws, total in db.session.execute(query)
+    }
+
+
+def win_percentage(wins: int, draws: int, losses: int) -> float:
+    """Return the score percentage counting draws as half a win."""
+    total = wins + draws + losses
+    if total == 0:
+        return 0.0
+    return round(((wins + 0.5 * draws) / total) * 100, 1)
+
+
+# sorts titles GM, IM, FM, none in SQL
+title_rank = case({'GM': 3, 'IM': 2, 'FM': 1}, value=Amiibo.title, else_=0)
+
+
+class Title(db.Model):
+    """A league or knockout title won by an Amiibo in a season."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    amiibo_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    # 'ko' (key is the bracket) or 'league' (key is the league)
+    kind = db.Column(db.String(10), nullable=False)
+    key = db.Column(db.String(20), nullable=False)
+    # season the title was won in; None for titles migrated without a season
+    season_id = db.Column(db.Integer, nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_title_amiibo_kind', 'amiibo_id', 'kind'),
+    )
+
+
+def refresh_titles(amiibo_ids: list[int] | None = None) -> None:
+    """Recompute the cached ``Amiibo.title`` from peak Elo and knockout titles."""
+    won = select(Title.amiibo_id, Title.key).where(Title.kind == 'ko')
+    amiibos = Amiibo.query
+    if amiibo_ids is not None:
+        won = won.where(Title.amiibo_id.in_(amiibo_ids))
+        amiibos = amiibos.filter(Amiibo.id.in_(amiibo_ids))
+    brackets = {}
+    for pid, key in db.session.execute(won):
+        brackets.setdefault(pid, []).append(key)
+    for a in amiibos:
+        a.title = compute_title(a.peak_elo, brackets.get(a.id, ()))
+
 
 class State(db.Model):
     """Generic key/value store for persisting application state."""
@@ -79,6 +208,133 @@ class State(db.Model):
     value = db.Column(db.Text)
 
 
+def upsert(model, keys, columns=()):
+    """Insert ``model`` rows, updating ``columns`` of rows whose ``keys`` exist.
+
+    With no ``columns`` existing rows are left alone. Each database spells
+    this differently, so the statement is built for the session's dialect.
+    """
+    table = model.__table__
+    dialect = db.session.get_bind().dialect.name
+    if dialect in ('mysql', 'mariadb'):
+        stmt = mysql.insert(table)
+        if not columns:
+            return stmt.prefix_with('IGNORE')
+        return stmt.on_duplicate_key_update({c: stmt.inserted[c] for c in columns})
+    if dialect not in ('sqlite', 'postgresql'):
+        raise NotImplementedError(f'no upsert for {dialect}')
+    stmt = (sqlite if dialect == 'sqlite' else postgresql).insert(table)
+    if not columns:
+        return stmt.on_conflict_do_nothing(index_elements=keys)
+    return stmt.on_conflict_do_update(index_elements=keys, set_={c: stmt.excluded[c] for c in columns})
+
+
+class PairingResult:
+    """Shared ``result`` accessor for pairing rows with winner/draw columns."""
+
+    @property
+    def result(self):
+        """Return ``'draw'``, the winner's ID or ``None`` if still unplayed."""
+        if self.draw:
+            return 'draw'
+        return self.winner_id
+
+    @result.setter
+    def result(self, value):
+        self.draw = value == 'draw'
+        self.winner_id = None if self.draw else value
+
+    @property
+    def points(self) -> tuple | None:
+        """Return ``(points1, points2)`` of a reported game, else ``None``."""
+        if self.draw:
+            return 0.5, 0.5
+        if self.winner_id is None:
+            return None
+        return (1, 0) if self.winner_id == self.player1_id else (0, 1)
+
+    @property
+    def pairing(self) -> tuple:
+        """Return the legacy ``(player1_id, player2_id, result)`` tuple."""
+        return (self.player1_id, self.player2_id, self.result)
+
+
+class SwissStanding(db.Model):
+    """Running Swiss score line of one Amiibo."""
+
+    amiibo_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), primary_key=True)
+    score = db.Column(db.Float, default=0, nullable=False)
+    diff = db.Column(db.Integer, default=0, nullable=False)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    buchholz = db.Column(db.Float, default=0, nullable=False)
+
+
+class SwissPairing(PairingResult, db.Model):
+    """A pairing of the Swiss stage, unplayed until a result is reported."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    round_no = db.Column(db.Integer, nullable=False, index=True)
+    player1_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    player2_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    winner_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=True)
+    draw = db.Column(db.Boolean, default=False, nullable=False)
+
+
+class LeagueStanding(db.Model):
+    """Score line of one Amiibo in its league group for the current season."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    league = db.Column(db.String(20), nullable=False, index=True)
+    amiibo_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False, unique=True)
+    score = db.Column(db.Float, default=0, nullable=False)
+    diff = db.Column(db.Integer, default=0, nullable=False)
+    wins = db.Column(db.Integer, default=0, nullable=False)
+    sonneborn_berger = db.Column(db.Float, default=0, nullable=False)
+
+
+class LeagueFixture(PairingResult, db.Model):
+    """A round-robin fixture of a league group."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    league = db.Column(db.String(20), nullable=False)
+    round_no = db.Column(db.Integer, nullable=False)
+    player1_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    player2_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    winner_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=True)
+    draw = db.Column(db.Boolean, default=False, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_league_fixture_league_round', 'league', 'round_no'),
+    )
+
+
+class KnockoutBracket(db.Model):
+    """A knockout bracket with its current round and eventual champion."""
+
+    key = db.Column(db.String(20), primary_key=True)
+    round_no = db.Column(db.Integer, default=1, nullable=False)
+    champion_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=True)
+    # JSON list of the bracket tree, see bracket.py
+    tree = db.Column(db.Text, nullable=True)
+
+
+class KnockoutMatch(PairingResult, db.Model):
+    """A bracket slot game; a drawn game is followed by a rematch in the same slot."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    bracket = db.Column(db.String(20), db.ForeignKey('knockout_bracket.key'), nullable=False)
+    round_no = db.Column(db.Integer, nullable=False)
+    slot = db.Column(db.Integer, nullable=False)
+    player1_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    player2_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    winner_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=True)
+    draw = db.Column(db.Boolean, default=False, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_knockout_match_bracket_round', 'bracket', 'round_no'),
+    )
+
+
 class Season(db.Model):
     """Archive data for a completed season."""
 
@@ -86,3 +342,59 @@ class Season(db.Model):
     league_data = db.Column(db.Text)
     knockout_data = db.Column(db.Text)
 
+
+class SeasonStanding(db.Model):
+    """Final league table row of an archived season."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    season_id = db.Column(db.Integer, db.ForeignKey('season.id'), nullable=False)
+    league = db.Column(db.String(20), nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+    amiibo_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=False)
+    score = db.Column(db.Float, default=0)
+    diff = db.Column(db.Integer, default=0)
+    wins = db.Column(db.Integer, default=0)
+    sonneborn_berger = db.Column(db.Float, default=0)
+
+    __table_args__ = (
+        db.Index('ix_season_standing_season_league', 'season_id', 'league', 'position'),
+    )
+
+
+class SeasonChampion(db.Model):
+    """Knockout bracket winner of an archived season."""
+
+    id = db.Column(db.Integer, primary_key=True)
+    season_id = db.Column(db.Integer, db.ForeignKey('season.id'), nullable=False)
+    bracket = db.Column(db.String(20), nullable=False)
+    amiibo_id = db.Column(db.Integer, db.ForeignKey('amiibo.id'), nullable=True)
+
+    __table_args__ = (
+        db.Index('ix_season_champion_season_bracket', 'season_id', 'bracket'),
+    )
+
+
+def store_season_results(season_id, scores, diffs, wins, tiebreaks, champions):
+    """Write the final league tables and bracket winners of a season.
+
+    The per-league dictionaries are keyed by league, then Amiibo ID;
+    leagues are ranked as on the league page.
+    """
+    rows = []
+    for lg in sorted(scores):
+        table, lg_diffs, lg_wins = scores[lg], diffs.get(lg, {}), wins.get(lg, {})
+        sb = tiebreaks.get(lg, {})
+        ranked = standings.rank(table, table, lg_diffs, lg_wins, sb)
+        for position, pid in enumerate(ranked, 1):
+            rows.append({
+                'season_id': season_id, 'league': lg, 'position': position,
+                'amiibo_id': pid, 'score': table[pid], 'diff': lg_diffs.get(pid, 0),
+                'wins': lg_wins.get(pid, 0), 'sonneborn_berger': sb.get(pid, 0),
+            })
+    if rows:
+        db.session.execute(insert(SeasonStanding), rows)
+    if champions:
+        db.session.execute(insert(SeasonChampion), [
+            {'season_id': season_id, 'bracket': key, 'amiibo_id': champ}
+            for key, champ in sorted(champions.items())
+        ])
@@ -0,0 +1,219 @@
+"""Swiss pairing without rematches.
+
+Players are paired in ranking order: the best unpaired player meets the
+nearest player below them they have not faced yet. When that leaves the
+rest unpairable the search backtracks. Unpaired players are kept in a
+doubly linked list so removing and restoring one is O(1); a round
+normally takes O(n) steps.
+
+The backtracking has a step budget. When it runs out (long events where
+most opponents have already been met) a maximum matching of the "not met
+yet" graph decides whether a rematch-free pairing exists and finds one,
+so a rematch is only produced when none exists.
+"""
+from collections import deque
+
+
+def pair_in_order(ids, forbidden, budget=None):
+    """Pair ``ids`` (in ranking order) avoiding ``forbidden`` pairs.
+
+    ``forbidden`` holds ``(a, b)`` tuples in either orientation. Returns a
+    list of ``(a, b)`` tuples or None if no pairing exists within
+    ``budget`` search steps.
+    """
+    n = len(ids)
+    if n % 2:
+        return None
+    if budget is None:
+        budget = 20 * n + 1000
+    # index n is the list head/tail sentinel
+    nxt = list(range(1, n + 1)) + [0]
+    prv = [n] + list(range(n))
+
+    def unlink(i):
+        nxt[prv[i]] = nxt[i]
+        prv[nxt[i]] = prv[i]
+
+    def relink(i):
+        nxt[prv[i]] = i
+        prv[nxt[i]] = i
+
+    def allowed(a, b):
+        return (ids[a], ids[b]) not in forbidden and (ids[b], ids[a]) not in forbidden
+
+    stack = []  # (top, opponent) choices made so far
+    top, start = nxt[n], None
+    while top != n:
+        budget -= 1
+        if budget < 0:
+            return None
+        j = nxt[top] if start is None else nxt[start]
+        while j != n and not allowed(top, j):
+            j = nxt[j]
+        if j != n:
+            unlink(top)
+            unlink(j)
+            stack.append((top, j))
+            top, start = nxt[n], None
+            continue
+        # no opponent left for top: undo the last choice and try further down
+        if not stack:
+            return None
+        top, start = stack.pop()
+        relink(start)
+        relink(top)
+    return [(ids[a], ids[b]) for a, b in stack]
+
+
+def max_matching(adj, match, skip=None):
+    """Grow ``match`` into a maximum matching of ``adj`` (Edmonds' blossoms).
+
+    ``adj`` lists the neighbours of each vertex and ``match`` holds each
+    vertex's partner or -1; it is updated in place. Vertex ``skip`` is left
+    out of the graph.
+    """
+    n = len(adj)
+
+    def augment(root):
+        parent = [-1] * n
+        base = list(range(n))
+        used = [False] * n
+        used[root] = True
+        queue = deque([root])
+
+        def lca(a, b):
+            seen = [False] * n
+            while True:
+                a = base[a]
+                seen[a] = True
+                if match[a] == -1:
+                    break
+                a = parent[match[a]]
+            while True:
+                b = base[b]
+                if seen[b]:
+                    return b
+                b = parent[match[b]]
+
+        def mark_path(v, b, child, blossom):
+            while base[v] != b:
+                blossom[base[v]] = blossom[base[match[v]]] = True
+                parent[v] = child
+                child = match[v]
+                v = parent[match[v]]
+
+        while queue:
+            v = queue.popleft()
+            for to in adj[v]:
+                if to == skip or base[v] == base[to] or match[v] == to:
+                    continue
+                if to == root or (match[to] != -1 and parent[match[to]] != -1):
+                    # odd cycle: contract the blossom onto its base
+                    b = lca(v, to)
+                    blossom = [False] * n
+                    mark_path(v, b, to, blossom)
+                    mark_path(to, b, v, blossom)
+                    for i in range(n):
+                        if blossom[base[i]]:
+                            base[i] = b
+                            if not used[i]:
+                                used[i] = True
+                                queue.append(i)
+                elif parent[to] == -1:
+                    parent[to] = v
+                    if match[to] == -1:
+                        # flip the alternating path back to the root
+                        while to != -1:
+                            prev = parent[to]
+                            after = match[prev]
+                            match[to], match[prev] = prev, to
+                            to = after
+                        return True
+                    used[match[to]] = True
+                    queue.append(match[to])
+        return False
+
+    # a vertex without an augmenting path never gets one later
+    for v in range(n):
+        if v != skip and match[v] == -1:
+            augment(v)
+
+
+class RematchFreeGraph:
+    """Players and the pairs they may still play, for complete pairing checks."""
+
+    def __init__(self, ids, forbidden):
+        self.ids = ids
+        n = len(ids)
+        self.adj = [
+            [
+                j for j in range(n)
+                if j != i and (ids[i], ids[j]) not in forbidden and (ids[j], ids[i]) not in forbidden
+            ]
+            for i in range(n)
+        ]
+        # start from a greedy pairing in ranking order, then augment it
+        self.match = [-1] * n
+        for i in range(n):
+            if self.match[i] == -1:
+                j = next((j for j in self.adj[i] if self.match[j] == -1), None)
+                if j is not None:
+                    self.match[i], self.match[j] = j, i
+        max_matching(self.adj, self.match)
+
+    def pairing(self, bye=None):
+        """Return a rematch-free pairing of everyone but ``bye``, or None if none exists."""
+        match = list(self.match)
+        if bye is not None:
+            i = self.ids.index(bye)
+            if match[i] != -1:
+                match[match[i]] = -1
+                match[i] = -1
+            max_matching(self.adj, match, skip=i)
+        if sum(m == -1 for m in match) != (0 if bye is None else 1):
+            return None
+        return [(self.ids[a], self.ids[b]) for a, b in enumerate(match) if a < b]
+
+
+def first_fit(ids, forbidden):
+    """Pair each player with the nearest one below them not yet faced."""
+    unpaired = list(ids)
+    pairs = []
+    while len(unpaired) > 1:
+        a = unpaired.pop(0)
+        idx = next(
+            (i for i, b in enumerate(unpaired) if (a, b) not in forbidden and (b, a) not in forbidden),
+            0,
+        )
+        pairs.append((a, unpaired.pop(idx)))
+    return pairs
+
+
+def pair_round(ids, previous_matches, byes=()):
+    """Return ``(pairs, bye)`` for a Swiss round.
+
+    ``ids`` are in ranking order (best first). With an odd count the bye
+    goes to the lowest ranked player whose removal leaves a rematch-free
+    pairing, preferring players who have not had a bye yet. Only when no
+    candidate allows one are rematches paired first-fit.
+    """
+    ids = list(ids)
+    if len(ids) < 2:
+        return [], (ids[0] if ids else None)
+    byes = set(byes)
+    if len(ids) % 2:
+        lowest = list(reversed(ids))
+        candidates = [p for p in lowest if p not in byes] + [p for p in lowest if p in byes]
+    else:
+        candidates = [None]
+    pairs = pair_in_order([p for p in ids if p != candidates[0]], previous_matches)
+    if pairs is not None:
+        return pairs, candidates[0]
+    graph = RematchFreeGraph(ids, previous_matches)
+    for bye in candidates:
+        rest = [p for p in ids if p != bye]
+        pairs = graph.pairing(bye)
+        if pairs is not None:
+            # keep the ranking order pairing when the budget allows it
+            return pair_in_order(rest, previous_matches) or pairs, bye
+    return first_fit([p for p in ids if p != candidates[0]], previous_matches), candidates[0]
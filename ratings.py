@@ -0,0 +1,224 @@
+"""Elo rating engine.
+
+The match log is loaded as flat ``array`` columns and replayed in a single
+tight loop, so current, peak and per-match ratings for every Amiibo can be
+rebuilt from scratch, e.g. after changing K or correcting an old result.
+
+Rating systems are pluggable through ``BACKENDS``: Elo rates every match
+as it is reported, Glicko-2 is ``batched`` and rates all matches of a
+rating period (a Swiss round, league matchday or knockout round) at once.
+"""
+import math
+from array import array
+
+from sqlalchemy import insert, select, update
+
+from models import db, Amiibo, Match, RatingHistory
+
+K = 32
+INITIAL_RATING = 1500
+INITIAL_DEVIATION = 350.0
+INITIAL_VOLATILITY = 0.06
+# Glicko-2 works on a rating scale divided by this constant
+GLICKO_SCALE = 173.7178
+
+
+def elo_update(r1: int, r2: int, score1: float, k: int = K) -> tuple[int, int]:
+    """Return the new ratings after a game (score1: 1=win, 0.5=draw, 0=loss)."""
+    expected1 = 1 / (1 + 10 ** ((r2 - r1) / 400))
+    expected2 = 1 - expected1
+    return r1 + int(k * (score1 - expected1)), r2 + int(k * ((1 - score1) - expected2))
+
+
+def load_match_log() -> tuple[array, array, array, array]:
+    """Return ``(match_ids, player1, player2, score1)`` columns in match order."""
+    match_ids, player1, player2, score1 = array('q'), array('q'), array('q'), array('d')
+    query = select(
+        Match.id, Match.player1_id, Match.player2_id, Match.winner_id, Match.draw
+    ).order_by(Match.id)
+    for mid, p1, p2, winner, draw in db.session.execute(query):
+        match_ids.append(mid)
+        player1.append(p1)
+        player2.append(p2)
+        score1.append(0.5 if draw else 1.0 if winner == p1 else 0.0)
+    return match_ids, player1, player2, score1
+
+
+def replay(log, k: int = K, initial: int = INITIAL_RATING):
+    """Replay a match log and return ``(current, peak, after1, after2)``.
+
+    ``current`` and ``peak`` map Amiibo IDs to ratings; ``after1`` and
+    ``after2`` hold both players' ratings after each match of the log.
+    """
+    _, player1, player2, score1 = log
+    current, peak = {}, {}
+    after1, after2 = array('q'), array('q')
+    get = current.get
+    for p1, p2, s1 in zip(player1, player2, score1):
+        r1, r2 = get(p1, initial), get(p2, initial)
+        # same arithmetic as elo_update(), inlined for speed
+        expected1 = 1 / (1 + 10 ** ((r2 - r1) / 400))
+        r1, r2 = r1 + int(k * (s1 - expected1)), r2 + int(k * ((1 - s1) - (1 - expected1)))
+        current[p1] = r1
+        current[p2] = r2
+        if r1 > peak.get(p1, initial):
+            peak[p1] = r1
+        if r2 > peak.get(p2, initial):
+            peak[p2] = r2
+        after1.append(r1)
+        after2.append(r2)
+    return current, peak, after1, after2
+
+
+def write_rating_history(log, after1, after2) -> int:
+    """Replace the rating history table with replayed ratings."""
+    match_ids, player1, player2, _ = log
+    rows = []
+    for mid, p1, p2, r1, r2 in zip(match_ids, player1, player2, after1, after2):
+        rows.append({'amiibo_id': p1, 'match_id': mid, 'rating': r1})
+        rows.append({'amiibo_id': p2, 'match_id': mid, 'rating': r2})
+    RatingHistory.query.delete()
+    if rows:
+        db.session.execute(insert(RatingHistory), rows)
+    return len(rows)
+
+
+def write_ratings(current, peak, initial: int = INITIAL_RATING) -> int:
+    """Store replayed current and peak Elo on every Amiibo."""
+    ids = db.session.scalars(select(Amiibo.id)).all()
+    rows = [
+        {
+            'id': pid,
+            'current_elo': current.get(pid, initial),
+            'peak_elo': peak.get(pid, initial),
+        }
+        for pid in ids
+    ]
+    if rows:
+        db.session.execute(update(Amiibo), rows)
+    return len(rows)
+
+
+class EloBackend:
+    """Fixed-K Elo; a period is just its matches applied in order."""
+
+    name = 'elo'
+    batched = False
+
+    def __init__(self, k: int = K):
+        self.k = k
+
+    def game_score(self, score1: int, score2: int) -> float:
+        """Score for player1: 1 for a win, 0.5 for a draw, 0 for a loss."""
+        return 0.5 if score1 == score2 else 1.0 if score1 > score2 else 0.0
+
+    def rate_period(self, ratings, games):
+        """Return updated ``{id: (rating, deviation, volatility)}``.
+
+        ``ratings`` holds the state of (at least) every player in ``games``,
+        a list of ``(player1, player2, score1, score2)`` tuples.
+        """
+        current = {pid: state[0] for pid, state in ratings.items()}
+        for p1, p2, score1, score2 in games:
+            current[p1], current[p2] = elo_update(
+                current[p1], current[p2], self.game_score(score1, score2), self.k
+            )
+        return {pid: (current[pid],) + tuple(state[1:]) for pid, state in ratings.items()}
+
+
+class Glicko2Backend:
+    """Glicko-2 (Glickman 2013) with a stock-margin weighted game score."""
+
+    name = 'glicko2'
+    batched = True
+
+    def __init__(self, tau: float = 0.5, stocks: int = 3, margin_share: float = 0.25):
+        self.tau = tau
+        self.stocks = stocks
+        self.margin_share = margin_share
+
+    def game_score(self, score1: int, score2: int) -> float:
+        """Score for player1 in [0, 1].
+
+        A win is worth ``1 - margin_share`` plus a share that grows with the
+        stock margin, so 3-0 scores 1.0 and 3-2 about 0.83 with the defaults.
+        """
+        if score1 == score2:
+            return 0.5
+        margin = min(abs(score1 - score2), self.stocks) / self.stocks
+        win = 1 - self.margin_share + self.margin_share * margin
+        return win if score1 > score2 else 1 - win
+
+    def rate_period(self, ratings, games):
+        """Return updated ``{id: (rating, deviation, volatility)}``.
+
+        Every player in ``ratings`` is updated: players without games in the
+        period keep their rating but their deviation grows.
+        """
+        scaled = {
+            pid: ((r - INITIAL_RATING) / GLICKO_SCALE, rd / GLICKO_SCALE, vol)
+            for pid, (r, rd, vol) in ratings.items()
+        }
+        # per player: [sum of g^2 E (1 - E), sum of g (s - E)]
+        sums = {}
+        for p1, p2, score1, score2 in games:
+            s1 = self.game_score(score1, score2)
+            mu1, phi1, _ = scaled[p1]
+            mu2, phi2, _ = scaled[p2]
+            for pid, mu, mu_opp, phi_opp, s in ((p1, mu1, mu2, phi2, s1), (p2, mu2, mu1, phi1, 1 - s1)):
+                g = 1 / math.sqrt(1 + 3 * phi_opp * phi_opp / math.pi ** 2)
+                e = 1 / (1 + math.exp(-g * (mu - mu_opp)))
+                acc = sums.setdefault(pid, [0.0, 0.0])
+                acc[0] += g * g * e * (1 - e)
+                acc[1] += g * (s - e)
+        max_phi = INITIAL_DEVIATION / GLICKO_SCALE
+        updated = {}
+        for pid, (mu, phi, sigma) in scaled.items():
+            if pid not in sums:
+                phi = min(math.sqrt(phi * phi + sigma * sigma), max_phi)
+                updated[pid] = (ratings[pid][0], phi * GLICKO_SCALE, sigma)
+                continue
+            info, improvement = sums[pid]
+            v = 1 / info
+            sigma = self.volatility(phi, sigma, v, v * improvement)
+            phi_star = math.sqrt(phi * phi + sigma * sigma)
+            phi = 1 / math.sqrt(1 / (phi_star * phi_star) + 1 / v)
+            mu += phi * phi * improvement
+            updated[pid] = (
+                mu * GLICKO_SCALE + INITIAL_RATING,
+                min(phi, max_phi) * GLICKO_SCALE,
+                sigma,
+            )
+        return updated
+
+    def volatility(self, phi, sigma, v, delta, epsilon=1e-6):
+        """New volatility via the Illinois root finder of the Glicko-2 paper."""
+        a = math.log(sigma * sigma)
+        tau2 = self.tau * self.tau
+
+        def f(x):
+            ex = math.exp(x)
+            d = phi * phi + v + ex
+            return ex * (delta * delta - phi * phi - v - ex) / (2 * d * d) - (x - a) / tau2
+
+        lo = a
+        if delta * delta > phi * phi + v:
+            hi = math.log(delta * delta - phi * phi - v)
+        else:
+            k = 1
+            while f(a - k * self.tau) < 0:
+                k += 1
+            hi = a - k * self.tau
+        f_lo, f_hi = f(lo), f(hi)
+        while abs(hi - lo) > epsilon:
+            mid = lo + (lo - hi) * f_lo / (f_hi - f_lo)
+            f_mid = f(mid)
+            if f_mid * f_hi <= 0:
+                lo, f_lo = hi, f_hi
+            else:
+                f_lo /= 2
+            hi, f_hi = mid, f_mid
+        return math.exp(lo / 2)
+
+
+BACKENDS = {backend.name: backend for backend in (EloBackend(), Glicko2Backend())}
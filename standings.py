@@ -0,0 +1,84 @@
+"""Standings order and tiebreaks shared by the Swiss and league tables.
+
+Players are ranked by points, stock difference, wins and then a tiebreak:
+Buchholz (sum of the opponents' scores) in the Swiss stage and
+Sonneborn-Berger (opponents' scores weighted by the points taken from
+them) in leagues. Both tiebreaks are stored with the standings and kept
+current with the ``*_update`` functions, which only touch the two players
+of a new result and the players who met them before.
+"""
+from collections import defaultdict
+
+
+def rank(ids, scores, diffs, wins, tiebreaks):
+    """Return ``ids`` best first; ties keep the order of ``ids``."""
+    return sorted(
+        ids,
+        key=lambda pid: (
+            scores.get(pid, 0),
+            diffs.get(pid, 0),
+            wins.get(pid, 0),
+            tiebreaks.get(pid, 0),
+        ),
+        reverse=True,
+    )
+
+
+def buchholz(scores, opponents):
+    """Full Buchholz for every player in ``scores``.
+
+    ``opponents`` maps a player to the set of players they have met.
+    """
+    return {
+        pid: sum(scores.get(o, 0) for o in opponents.get(pid, ()))
+        for pid in scores
+    }
+
+
+def sonneborn_berger(scores, results):
+    """Full Sonneborn-Berger for every player in ``scores``.
+
+    ``results`` maps a player to ``(opponent, points)`` for each game.
+    """
+    return {
+        pid: sum(scores.get(o, 0) * pts for o, pts in results.get(pid, ()))
+        for pid in scores
+    }
+
+
+def buchholz_update(gains, opponents, scores, new_pair=None):
+    """Return Buchholz changes after the players in ``gains`` scored.
+
+    ``gains`` maps players to the points just gained, ``opponents`` holds
+    their opponent sets before the game and ``scores`` the scores after it.
+    ``new_pair`` is the ``(p1, p2)`` of a reported pairing; opponents are a
+    set, so a rematch does not count the opponent twice.
+    """
+    deltas = defaultdict(float)
+    for pid, gained in gains.items():
+        for o in opponents.get(pid, ()):
+            deltas[o] += gained
+    if new_pair:
+        p1, p2 = new_pair
+        if p2 not in opponents.get(p1, ()):
+            deltas[p1] += scores[p2]
+            deltas[p2] += scores[p1]
+    return deltas
+
+
+def sonneborn_berger_update(gains, earlier, scores, new_result=None):
+    """Return Sonneborn-Berger changes after the players in ``gains`` scored.
+
+    ``earlier`` lists ``(player, opponent, points)`` for every previous game
+    against a player in ``gains``, seen from the other side. ``scores`` are
+    the scores after the game and ``new_result`` is ``(p1, p2, points1,
+    points2)`` when the game itself counts as a result.
+    """
+    deltas = defaultdict(float)
+    for pid, opp, pts in earlier:
+        deltas[pid] += gains[opp] * pts
+    if new_result:
+        p1, p2, pts1, pts2 = new_result
+        deltas[p1] += scores[p2] * pts1
+        deltas[p2] += scores[p1] * pts2
+    return deltas
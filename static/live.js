@@ -0,0 +1,27 @@
+document.addEventListener('DOMContentLoaded', function() {
+    const feed = document.getElementById('live-feed');
+    if (!feed || !window.EventSource) return;
+    const list = feed.querySelector('ul');
+    // event kinds that change this page's layout, e.g. "swiss_round leagues"
+    const reloadOn = (feed.dataset.reload || '').split(' ').filter(Boolean);
+    const source = new EventSource('/events');
+
+    source.addEventListener('result', function(e) {
+        const data = JSON.parse(e.data);
+        const [p1, p2] = data.players;
+        const item = document.createElement('li');
+        item.textContent = p1.name + ' ' + p1.score + ' - ' + p2.score + ' ' + p2.name;
+        list.prepend(item);
+        while (list.children.length > 10) list.lastElementChild.remove();
+        feed.classList.remove('hidden');
+        // pages patch their own tables from the result, see league.html
+        document.dispatchEvent(new CustomEvent('live-result', {detail: data}));
+    });
+
+    reloadOn.forEach(function(kind) {
+        source.addEventListener(kind, function() {
+            source.close();
+            window.location.reload();
+        });
+    });
+});
@@ -0,0 +1,52 @@
+"""Shared fixtures: the app bound to a scratch SQLite file, emptied per test."""
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+# the app binds its database at import
+os.environ['FLASK_SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + os.path.join(tempfile.mkdtemp(), 'test.db')
+
+import app as appmod  # noqa: E402
+from eventlog import take_snapshot  # noqa: E402
+from models import db, State, SwissPairing  # noqa: E402
+
+
+@pytest.fixture
+def app():
+    """The app with empty tables, a fresh action log and no cached pages."""
+    flask_app = appmod.app
+    backend = flask_app.config['RATING_BACKEND']
+    with flask_app.app_context():
+        for table in reversed(db.metadata.sorted_tables):
+            db.session.execute(table.delete())
+        db.session.add(State(key='version', value='0'))
+        take_snapshot()
+        db.session.commit()
+    appmod.page_cache.pages.clear()
+    yield flask_app
+    flask_app.config['RATING_BACKEND'] = backend
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+def add_players(client, count):
+    """Add ``count`` Amiibos named P0, P1, ... and return their IDs."""
+    client.post('/add_amiibos', data={'names': '\n'.join(f'P{i}' for i in range(count))})
+    return list(range(1, count + 1))
+
+
+def finish_swiss(app, client):
+    """Play every Swiss round, player 1 winning, until the leagues are drawn."""
+    with app.app_context():
+        while pairings := SwissPairing.query.filter_by(winner_id=None, draw=False).all():
+            for p in pairings:
+                client.post('/report_swiss_result', data={
+                    'player1': p.player1_id, 'player2': p.player2_id, 'score1': 1, 'score2': 0,
+                })
@@ -0,0 +1,37 @@
+"""``?fields=`` selection on the JSON list endpoints."""
+import pytest
+
+from conftest import add_players, finish_swiss
+
+
+@pytest.mark.parametrize('url', [
+    '/api/v1/amiibos', '/api/v1/matches', '/api/v1/league', '/api/v1/knockout', '/api/v1/seasons',
+])
+def test_unknown_field_rejected_on_empty_lists(app, client, url):
+    response = client.get(url + '?fields=id,bogus')
+    assert response.status_code == 400
+    assert 'bogus' in response.get_json()['error']
+
+
+def test_league_fixture_fields(app, client):
+    add_players(client, 8)
+    client.post('/start_swiss')
+    finish_swiss(app, client)
+    body = client.get('/api/v1/league?fields=amiibo_id,score&fixture_fields=round,winner_id').get_json()
+    assert body['leagues']
+    for league in body['leagues']:
+        assert all(set(row) == {'amiibo_id', 'score'} for row in league['standings'])
+        assert league['fixtures']
+        assert all(set(row) == {'round', 'winner_id'} for row in league['fixtures'])
+    assert client.get('/api/v1/league?fixture_fields=name').status_code == 400
+
+
+def test_knockout_fields(app, client):
+    add_players(client, 8)
+    client.post('/start_swiss')
+    finish_swiss(app, client)
+    client.post('/finish_league')
+    body = client.get('/api/v1/knockout?fields=player1_id,player2_id').get_json()
+    games = [game for bracket in body['brackets'] for rnd in bracket['rounds'] for game in rnd]
+    assert games
+    assert all(set(game) == {'player1_id', 'player2_id'} for game in games)
@@ -0,0 +1,37 @@
+"""Concurrent writers through serialized_write() must not lose updates."""
+import threading
+
+from conftest import add_players
+from models import db, Match, State
+
+WRITERS = 6
+REPORTS = 25
+
+
+def test_concurrent_match_reports_are_all_kept(app, client):
+    players = add_players(client, 12)
+    codes = []
+
+    def writer(n):
+        own = app.test_client()
+        for i in range(REPORTS):
+            p1 = players[(n * 2) % len(players)]
+            p2 = players[(n * 2 + 1 + i) % len(players)]
+            if p1 == p2:
+                p2 = players[(n * 2 + 2) % len(players)]
+            response = own.post(
+                '/report_match', data={'player1': p1, 'player2': p2, 'score1': 3, 'score2': i % 3}
+            )
+            codes.append(response.status_code)
+
+    threads = [threading.Thread(target=writer, args=(n,)) for n in range(WRITERS)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert codes == [302] * (WRITERS * REPORTS)
+    with app.app_context():
+        assert Match.query.count() == WRITERS * REPORTS
+        # one bump for adding the players, one per reported match
+        assert db.session.get(State, 'version').value == str(WRITERS * REPORTS + 1)
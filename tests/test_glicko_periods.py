@@ -0,0 +1,95 @@
+"""Glicko-2 rating periods end with tournament rounds, not with friendlies."""
+import json
+
+from conftest import add_players, finish_swiss
+from models import db, GlickoRating, KnockoutMatch, LeagueFixture, LiveEvent, Match, SwissPairing, State
+
+
+def deviations(app):
+    with app.app_context():
+        return {r.amiibo_id: r.deviation for r in GlickoRating.query}
+
+
+def play_swiss_round(app, client):
+    with app.app_context():
+        games = [(p.player1_id, p.player2_id) for p in SwissPairing.query.filter_by(winner_id=None, draw=False)]
+    for p1, p2 in games:
+        client.post('/report_swiss_result', data={'player1': p1, 'player2': p2, 'score1': 3, 'score2': 1})
+    return games
+
+
+def test_friendlies_leave_idle_deviation_alone(app, client):
+    app.config['RATING_BACKEND'] = 'glicko2'
+    players = add_players(client, 6)
+    client.post('/start_swiss')
+    play_swiss_round(app, client)
+    before = deviations(app)
+    assert set(before) == set(players)
+    busy = players[:2]
+    for _ in range(5):
+        client.post('/report_match', data={'player1': busy[0], 'player2': busy[1], 'score1': 3, 'score2': 0})
+    client.post('/report_results', json={'results': [
+        {'type': 'match', 'player1': busy[0], 'player2': busy[1], 'score1': 0, 'score2': 3},
+    ]})
+    # nobody is rated yet, so no deviation grows either
+    assert deviations(app) == before
+
+
+def test_friendlies_are_rated_with_the_next_period(app, client):
+    app.config['RATING_BACKEND'] = 'glicko2'
+    players = add_players(client, 6)
+    client.post('/start_swiss')
+    play_swiss_round(app, client)
+    client.post('/report_match', data={'player1': players[0], 'player2': players[1], 'score1': 3, 'score2': 0})
+    with app.app_context():
+        rated_before = db.session.get(State, 'rated_through').value
+    play_swiss_round(app, client)
+    with app.app_context():
+        rated_after = db.session.get(State, 'rated_through').value
+        assert rated_after != rated_before
+        assert rated_after == str(db.session.query(db.func.max(Match.id)).scalar())
+
+
+def rated_through(app):
+    with app.app_context():
+        return db.session.get(State, 'rated_through').value
+
+
+def test_one_period_per_knockout_round_across_brackets(app, client):
+    app.config['RATING_BACKEND'] = 'glicko2'
+    add_players(client, 16)
+    client.post('/start_swiss')
+    finish_swiss(app, client)
+    with app.app_context():
+        fixtures = [(f.league, f.round_no, f.player1_id, f.player2_id) for f in LeagueFixture.query]
+    for league, rnd, p1, p2 in fixtures:
+        client.post('/report_league_result', data={
+            'league': league, 'round': rnd, 'player1': p1, 'player2': p2, 'score1': 3, 'score2': 1,
+        })
+    client.post('/finish_league')
+    with app.app_context():
+        games = [
+            (m.bracket, m.slot, m.player1_id, m.player2_id)
+            for m in KnockoutMatch.query.order_by(KnockoutMatch.bracket, KnockoutMatch.slot)
+        ]
+    assert {key for key, _, _, _ in games} == {'AB', 'CD'}
+    closed = []
+    for key, slot, p1, p2 in games:
+        before = rated_through(app)
+        client.post('/report_knockout_result', data={
+            'bracket': key, 'slot': slot, 'player1': p1, 'player2': p2, 'score1': 3, 'score2': 0,
+        })
+        closed.append(rated_through(app) != before)
+    # bracket AB finishing its round first does not end the period
+    assert closed == [False] * (len(games) - 1) + [True]
+
+
+def test_results_carry_no_stale_rating(app, client):
+    app.config['RATING_BACKEND'] = 'glicko2'
+    players = add_players(client, 2)
+    client.post('/report_match', data={'player1': players[0], 'player2': players[1], 'score1': 3, 'score2': 0})
+    with app.app_context():
+        event = LiveEvent.query.filter_by(kind='result').one()
+    payload = json.loads(event.payload)
+    assert payload['rated'] is False
+    assert [p['rating'] for p in payload['players']] == [None, None]
@@ -0,0 +1,45 @@
+"""Bulk import parsing and validation."""
+import pytest
+
+from app import parse_import
+from models import Amiibo
+
+
+def test_plain_lines_keep_commas_in_names():
+    assert parse_import('Mario, Jr.') == ['Mario, Jr.']
+    assert parse_import('Mario, Jr.\nPeach\nBowser; the King') == ['Mario, Jr.', 'Peach', 'Bowser; the King']
+
+
+def test_csv_needs_a_header_or_consistent_columns():
+    assert parse_import('name,league\nMario, Jr.,A\nPeach,B') == ['Mario', 'Peach']
+    assert parse_import('"Mario, Jr.",A\nPeach,B') == ['Mario, Jr.', 'Peach']
+    assert parse_import('Mario;A\nPeach;B') == ['Mario', 'Peach']
+    assert parse_import('name\nMario\nPeach') == ['Mario', 'Peach']
+
+
+def test_json_lists_and_objects():
+    assert parse_import('["Mario", {"name": "Peach"}]') == ['Mario', 'Peach']
+    assert parse_import('{"names": ["Mario"]}') == ['Mario']
+
+
+@pytest.mark.parametrize('raw', ['[1, 2]', '{"names": "Mario"}', '["Mario",', '[{"id": 3}]'])
+def test_bad_json_is_rejected(raw):
+    with pytest.raises(ValueError):
+        parse_import(raw)
+
+
+def test_bad_json_form_and_body_return_400(app, client):
+    response = client.post('/add_amiibos', data={'names': '["Mario",'})
+    assert response.status_code == 400
+    assert b'Nothing imported' in response.data
+    response = client.post('/add_amiibos', json={'names': 'Mario'})
+    assert response.status_code == 400
+    assert 'error' in response.get_json()
+    with app.app_context():
+        assert Amiibo.query.count() == 0
+
+
+def test_comma_names_are_imported_whole(app, client):
+    client.post('/add_amiibos', data={'names': 'Mario, Jr.\nPeach'})
+    with app.app_context():
+        assert sorted(a.name for a in Amiibo.query) == ['Mario, Jr.', 'Peach']
@@ -0,0 +1,65 @@
+"""Live ``result`` events say which competition the result belongs to."""
+import json
+
+import app as appmod
+from conftest import add_players, finish_swiss
+from models import LeagueFixture, LiveEvent, SwissPairing
+
+
+def last_result():
+    event = LiveEvent.query.filter_by(kind='result').order_by(LiveEvent.id.desc()).first()
+    return json.loads(event.payload)
+
+
+def test_result_context(app, client):
+    add_players(client, 8)
+    client.post('/report_match', data={'player1': 1, 'player2': 2, 'score1': 1, 'score2': 0})
+    with app.app_context():
+        assert last_result()['context'] == {'type': 'friendly'}
+
+    client.post('/start_swiss')
+    with app.app_context():
+        pairing = SwissPairing.query.filter_by(winner_id=None, draw=False).first()
+        game = {'player1': pairing.player1_id, 'player2': pairing.player2_id}
+    client.post('/report_swiss_result', data=dict(game, score1=2, score2=1))
+    with app.app_context():
+        assert last_result()['context'] == {'type': 'swiss'}
+
+
+def test_league_result_context(app, client):
+    add_players(client, 8)
+    client.post('/start_swiss')
+    finish_swiss(app, client)
+    with app.app_context():
+        fixture = LeagueFixture.query.first()
+        game = {
+            'league': fixture.league, 'round': fixture.round_no,
+            'player1': fixture.player1_id, 'player2': fixture.player2_id,
+        }
+    client.post('/report_league_result', data=dict(game, score1=0, score2=0))
+    with app.app_context():
+        event = last_result()
+    assert event['context'] == {'type': 'league', 'league': game['league']}
+    assert event['round'] == game['round'] and event['draw']
+    # the page patches this result in place rather than reloading on it
+    page = client.get('/league').get_data(as_text=True)
+    assert 'data-reload="leagues"' in page
+    assert f'data-fixture="{game["league"]}-{game["round"]}-{game["player1"]}-{game["player2"]}"' in page
+
+
+def test_feed_waits_for_ids_that_commit_late():
+    feed = appmod.EventFeed(10)
+    rows = [(1, 'result', '{}'), (3, 'result', '{}')]
+    # 2 is not visible yet: deliver 1 and hold the cursor there
+    assert feed.settle(rows, 0, now=100) == ([rows[0]], 1)
+    assert feed.settle(rows[1:], 1, now=101) == ([], 1)
+    late = [(2, 'result', '{}'), (3, 'result', '{}')]
+    assert feed.settle(late, 1, now=102) == (late, 3)
+
+
+def test_feed_steps_over_ids_that_never_commit():
+    feed = appmod.EventFeed(10)
+    rows = [(5, 'result', '{}'), (6, 'result', '{}')]
+    assert feed.settle(rows, 2, now=100) == ([], 2)
+    assert feed.settle(rows, 2, now=100 + appmod.LIVE_GAP_WAIT) == ([], 4)
+    assert feed.settle(rows, 4, now=100 + appmod.LIVE_GAP_WAIT) == (rows, 6)
@@ -0,0 +1,30 @@
+"""Schema version bookkeeping of ``migrate()``."""
+import json
+
+import pytest
+from flask import Flask
+
+from migrations import MIGRATIONS, migrate
+from models import db, State
+
+
+@pytest.fixture
+def fresh_app(tmp_path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///' + str(tmp_path / 'fresh.db')
+    db.init_app(app)
+    with app.app_context():
+        yield app
+        db.session.remove()
+        db.engine.dispose()
+
+
+def recorded_version():
+    return json.loads(db.session.get(State, 'schema_version').value)
+
+
+def test_version_is_kept_in_state(fresh_app):
+    assert migrate() == len(MIGRATIONS)
+    assert recorded_version() == len(MIGRATIONS)
+    assert migrate() == 0
+
@@ -0,0 +1,66 @@
+"""Swiss pairing never pairs a rematch while a rematch-free pairing exists."""
+import itertools
+import random
+
+import pytest
+
+from pairing import pair_round
+
+
+def rematches(pairs, forbidden):
+    return [(a, b) for a, b in pairs if (a, b) in forbidden or (b, a) in forbidden]
+
+
+def has_perfect_pairing(ids, forbidden):
+    if not ids:
+        return True
+    a, rest = ids[0], ids[1:]
+    return any(
+        (a, b) not in forbidden and (b, a) not in forbidden
+        and has_perfect_pairing([p for p in rest if p != b], forbidden)
+        for b in rest
+    )
+
+
+def test_bye_found_beyond_the_lowest_ranked_players():
+    # 1-3 may only meet each other and 4-11 only each other, so the bye
+    # has to go to one of the top three
+    ids = list(range(1, 12))
+    top, bottom = ids[:3], ids[3:]
+    forbidden = {(a, b) for a in top for b in bottom}
+    pairs, bye = pair_round(ids, forbidden)
+    assert bye == 3
+    assert not rematches(pairs, forbidden)
+    assert sorted(p for pair in pairs for p in pair) == [p for p in ids if p != bye]
+
+
+def test_late_round_trap_beyond_the_search_budget():
+    # the last three have only met player 1's opponents: they can still play
+    # each other and player 1, which the ranking order search decides first
+    # and only revisits after exhausting every pairing of the field between
+    ids = list(range(1, 41))
+    last = ids[-3:]
+    forbidden = {(a, b) for a in last for b in ids[1:-3]}
+    pairs, bye = pair_round(ids, forbidden)
+    assert bye is None
+    assert not rematches(pairs, forbidden)
+    assert sorted(p for pair in pairs for p in pair) == ids
+
+
+@pytest.mark.parametrize('seed', range(40))
+def test_rematch_only_when_unavoidable(seed):
+    rng = random.Random(seed)
+    ids = list(range(1, rng.randint(4, 11) + 1))
+    pairs_all = list(itertools.combinations(ids, 2))
+    forbidden = set(rng.sample(pairs_all, rng.randint(0, len(pairs_all) * 2 // 3)))
+    byes = set(rng.sample(ids, rng.randint(0, len(ids) // 2)))
+    pairs, bye = pair_round(ids, forbidden, byes)
+    if len(ids) % 2:
+        possible = [b for b in ids if has_perfect_pairing([p for p in ids if p != b], forbidden)]
+    else:
+        possible = [None] if has_perfect_pairing(ids, forbidden) else []
+    if possible:
+        assert not rematches(pairs, forbidden)
+        # the lowest ranked possible bye, players without one first
+        assert bye == min(possible, key=lambda b: (b in byes, -b) if b else 0)
+    assert sorted(p for pair in pairs for p in pair) == [p for p in ids if p != bye]
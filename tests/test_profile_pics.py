@@ -0,0 +1,35 @@
+"""Profile picture uploads survive a retried write."""
+import hashlib
+import io
+import os
+
+import app as appmod
+from conftest import add_players
+from models import Amiibo
+
+
+def test_upload_retried_after_conflict_keeps_the_picture(app, client, monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    # store the original bytes, as without Pillow
+    monkeypatch.setattr(appmod, 'Image', None)
+    add_players(client, 1)
+    save_state = appmod.save_state
+    calls = []
+
+    def conflict_once():
+        calls.append(1)
+        if len(calls) == 1:
+            raise appmod.StateConflict()
+        save_state()
+
+    monkeypatch.setattr(appmod, 'save_state', conflict_once)
+    data = b'not really a png'
+    response = client.post('/upload_pic/1', data={'picture': (io.BytesIO(data), 'pic.png')})
+    assert response.status_code == 302
+    assert len(calls) == 2
+    digest = hashlib.sha256(data).hexdigest()[:16]
+    with app.app_context():
+        assert Amiibo.query.get(1).profile_pic == digest + '.png'
+    files = sorted(os.listdir('profile'))
+    assert files == sorted(f'{digest}-{size}.png' for size in appmod.PROFILE_SIZES)
+    assert all(os.path.getsize(os.path.join('profile', name)) == len(data) for name in files)
@@ -0,0 +1,63 @@
+"""Replaying the action log rebuilds the tables without side effects."""
+from conftest import add_players
+from models import Amiibo, LiveEvent, Match
+
+
+def report(client, p1, p2, s1, s2):
+    client.post('/report_match', data={'player1': p1, 'player2': p2, 'score1': s1, 'score2': s2})
+
+
+def test_replay_log_publishes_no_events(app, client):
+    add_players(client, 4)
+    report(client, 1, 2, 3, 1)
+    report(client, 3, 4, 0, 2)
+    with app.app_context():
+        events = LiveEvent.query.count()
+    result = app.test_cli_runner().invoke(args=['replay-log'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert LiveEvent.query.count() == events
+        assert Match.query.count() == 2
+
+
+def test_undo_publishes_no_events(app, client):
+    add_players(client, 4)
+    report(client, 1, 2, 3, 1)
+    report(client, 3, 4, 0, 2)
+    with app.app_context():
+        events = LiveEvent.query.count()
+    result = app.test_cli_runner().invoke(args=['undo-last-result'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert LiveEvent.query.count() == events
+        assert Match.query.count() == 1
+
+
+def test_undo_refuses_to_drop_rebuilt_ratings(app, client):
+    add_players(client, 2)
+    report(client, 1, 2, 3, 1)
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['rebuild-ratings', '--k', '100']).exit_code == 0
+    with app.app_context():
+        rebuilt = {a.id: a.current_elo for a in Amiibo.query}
+    result = runner.invoke(args=['undo-last-result'])
+    assert result.exit_code != 0
+    assert 'rebuild-ratings' in result.output
+    with app.app_context():
+        assert {a.id: a.current_elo for a in Amiibo.query} == rebuilt
+        assert Match.query.count() == 1
+
+
+def test_undo_after_rebuild_keeps_rebuilt_ratings(app, client):
+    add_players(client, 2)
+    report(client, 1, 2, 3, 1)
+    runner = app.test_cli_runner()
+    assert runner.invoke(args=['rebuild-ratings', '--k', '100']).exit_code == 0
+    with app.app_context():
+        rebuilt = {a.id: a.current_elo for a in Amiibo.query}
+    report(client, 1, 2, 0, 2)
+    result = runner.invoke(args=['undo-last-result'])
+    assert result.exit_code == 0, result.output
+    with app.app_context():
+        assert {a.id: a.current_elo for a in Amiibo.query} == rebuilt
+        assert Match.query.count() == 1
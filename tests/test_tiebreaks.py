@@ -0,0 +1,108 @@
+"""Incrementally kept tiebreaks must equal a full recomputation."""
+import random
+
+import pytest
+
+import standings
+from conftest import add_players
+from models import LeagueFixture, LeagueStanding, SwissPairing, SwissStanding
+
+OUTCOMES = ((1, 0), (0, 1), (0.5, 0.5))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_buchholz_updates_match_full_recomputation(seed):
+    rng = random.Random(seed)
+    ids = list(range(1, rng.randint(4, 16) + 1))
+    scores = {pid: 0 for pid in ids}
+    opponents = {}
+    kept = {pid: 0.0 for pid in ids}
+    for _ in range(rng.randint(5, 60)):
+        p1, p2 = rng.sample(ids, 2)
+        pts1, pts2 = rng.choice(OUTCOMES)
+        # now and then a result outside the pairings, which scores but has no opponent
+        paired = rng.random() > 0.1
+        gains = {p1: pts1, p2: pts2}
+        scores[p1] += pts1
+        scores[p2] += pts2
+        for pid, delta in standings.buchholz_update(gains, opponents, scores, (p1, p2) if paired else None).items():
+            kept[pid] += delta
+        if paired:
+            opponents.setdefault(p1, set()).add(p2)
+            opponents.setdefault(p2, set()).add(p1)
+        full = standings.buchholz(scores, opponents)
+        assert kept == pytest.approx(full)
+    order = standings.rank(ids, scores, {}, {}, kept)
+    assert order == standings.rank(ids, scores, {}, {}, standings.buchholz(scores, opponents))
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_sonneborn_berger_updates_match_full_recomputation(seed):
+    rng = random.Random(seed)
+    ids = list(range(1, rng.randint(3, 8) + 1))
+    scores = {pid: 0 for pid in ids}
+    results = {}
+    kept = {pid: 0.0 for pid in ids}
+    for _ in range(rng.randint(3, 40)):
+        p1, p2 = rng.sample(ids, 2)
+        pts1, pts2 = rng.choice(OUTCOMES)
+        gains = {p1: pts1, p2: pts2}
+        earlier = [
+            (pid, opp, pts)
+            for pid, games in results.items()
+            for opp, pts in games
+            if opp in gains
+        ]
+        scores[p1] += pts1
+        scores[p2] += pts2
+        for pid, delta in standings.sonneborn_berger_update(gains, earlier, scores, (p1, p2, pts1, pts2)).items():
+            kept[pid] += delta
+        results.setdefault(p1, []).append((p2, pts1))
+        results.setdefault(p2, []).append((p1, pts2))
+        assert kept == pytest.approx(standings.sonneborn_berger(scores, results))
+    order = standings.rank(ids, scores, {}, {}, kept)
+    assert order == standings.rank(ids, scores, {}, {}, standings.sonneborn_berger(scores, results))
+
+
+def play(client, model, url, rng, **fields):
+    """Report every open game of ``model`` with random scores; return how many."""
+    games = [
+        dict({k: getattr(g, attr) for k, attr in fields.items()}, player1=g.player1_id, player2=g.player2_id)
+        for g in model.query.filter_by(winner_id=None, draw=False).order_by(model.id)
+    ]
+    for game in games:
+        s1, s2 = rng.randint(0, 3), rng.randint(0, 3)
+        client.post(url, data=dict(game, score1=s1, score2=s2))
+    return len(games)
+
+
+def test_stored_tiebreaks_match_recomputation_after_play(app, client):
+    rng = random.Random(7)
+    add_players(client, 13)
+    client.post('/start_swiss')
+    with app.app_context():
+        while play(client, SwissPairing, '/report_swiss_result', rng):
+            pass
+        opponents = {}
+        for p in SwissPairing.query:
+            if p.points:
+                opponents.setdefault(p.player1_id, set()).add(p.player2_id)
+                opponents.setdefault(p.player2_id, set()).add(p.player1_id)
+        rows = SwissStanding.query.all()
+        full = standings.buchholz({s.amiibo_id: s.score for s in rows}, opponents)
+        assert {s.amiibo_id: s.buchholz for s in rows} == pytest.approx(full)
+
+        for _ in range(3):
+            play(client, LeagueFixture, '/report_league_result', rng, league='league', round='round_no')
+        results = {}
+        for f in LeagueFixture.query:
+            if f.points:
+                pts1, pts2 = f.points
+                results.setdefault(f.player1_id, []).append((f.player2_id, pts1))
+                results.setdefault(f.player2_id, []).append((f.player1_id, pts2))
+        rows = LeagueStanding.query.all()
+        assert results
+        for league in {s.league for s in rows}:
+            table = {s.amiibo_id: s.score for s in rows if s.league == league}
+            kept = {s.amiibo_id: s.sonneborn_berger for s in rows if s.league == league}
+            assert kept == pytest.approx(standings.sonneborn_berger(table, results))